@@ -0,0 +1,496 @@
+import os
+import re
+import time
+import random
+import asyncio
+import argparse
+import hashlib
+import threading
+from collections import OrderedDict
+import httpx
+
+from .tools.confluence_client import collect_confluence_search
+from .tools.http_client import get_http_client, confluence_config
+from .tools.scrape_cache import get_scrape_cache, ScrapeCache
+from .tools.scrape_webpage_content import SCRAPE_HEADERS, SCRAPE_TIMEOUT, scrape_webpage_content_async
+from .tools.scrape_webpages import scrape_webpages_async
+from .tools.internal_confluence_search import internal_confluence_search_async
+from .tools.federated_search import federated_search_async
+from .tools.passages import tokenize
+from .tools.resilience import deadline_scope
+from .tools.telemetry import get_logger, span, Counter, METRICS
+
+
+logger = get_logger(__name__)
+
+DEFAULT_TTL = 86400
+DEFAULT_MAX_ENTRIES = 256
+# Token-set Jaccard similarity two questions need to share an answer, on top of having the same
+# canonical token set (see is_rewording), so it only matters when the synonym rule is relaxed.
+# Backed by EVAL_PAIRS: `python -m IntelligentSearchAgent.answer_cache eval`.
+DEFAULT_MIN_SIMILARITY = 0.5
+# Seconds allowed for re-checking an entry's sources before the lookup counts as a miss.
+DEFAULT_VALIDATE_TIMEOUT = 5.0
+
+# MinHash signature length and LSH band width: 16 bands of 2 rows make pairs with a Jaccard of
+# 0.5 candidates with 99% probability, and the exact checks then decide.
+NUM_PERMUTATIONS = 32
+BAND_ROWS = 2
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERMUTATIONS)]
+
+# Request phrasing that does not change what is being asked, on top of the passage stopwords.
+_FILLER = frozenset(
+    "please tell know show give let us can could would should currently using running use run get "
+    "anyone any there".split()
+)
+# Negated contractions become a separate "not", which stays in the token set like "no" and "never".
+_NEGATION_RE = re.compile(r"\bcannot\b|\b(?:can|won)['’]t\b|n['’]t\b")
+_POSSESSIVE_RE = re.compile(r"['’]s\b")
+# Verb phrases written both split and closed up; the closed-up form is kept.
+_COMPOUND_RE = re.compile(r"\b(set|log|sign)[ -](up|in|on)\b")
+# Words that may differ between two questions without changing what is asked (after plural stripping).
+# Every word is replaced by the first word of its group.
+_SYNONYM_GROUPS = [
+    ("prod", "production"), ("db", "database"), ("config", "configuration", "setting"), ("repo", "repository"),
+    ("doc", "documentation"), ("k8s", "kubernete"), ("env", "environment"), ("auth", "authentication"),
+    ("app", "application"), ("delete", "remove"), ("create", "make"), ("fix", "resolve"),
+    ("mfa", "2fa"), ("latest", "newest"), ("setup", "install"), ("guide", "instruction", "step"), ("own", "owner"),
+]
+_CANONICAL = {word: group[0] for group in _SYNONYM_GROUPS for word in group}
+_URL_IN_TEXT_RE = re.compile(r"https?://[^\s<>()\[\]\"'`]+")
+
+# Tools whose results carry the Confluence page ids/versions or scraped URLs an answer is built from.
+CONFLUENCE_TOOLS = frozenset({internal_confluence_search_async.__name__, federated_search_async.__name__})
+SCRAPE_TOOLS = frozenset({scrape_webpage_content_async.__name__, scrape_webpages_async.__name__})
+
+ANSWER_CACHE_LOOKUPS = Counter("agent_answer_cache_lookups_total", "Answer cache lookups, by result (hit, miss, stale, bypass).")
+ANSWER_CACHE_STORES = Counter("agent_answer_cache_stores_total", "Research answers stored in the answer cache (stored) or not cacheable (skipped).")
+METRICS.extend([ANSWER_CACHE_LOOKUPS, ANSWER_CACHE_STORES])
+
+
+def normalize_tokens(question):
+    """
+    Returns the set of content words of `question`: lower-cased, without stopwords or request
+    filler, with plural 's' removed and synonyms replaced by one canonical word, so rephrasings like
+    "which kafka version are we running" and "What version of Kafka are we on?" normalize to the
+    same set, as do "prod db config" and "production database configuration". Negations are kept
+    ("don't" adds "not").
+    """
+    tokens = set()
+    text = _POSSESSIVE_RE.sub("", _NEGATION_RE.sub(" not", (question or "").lower()))
+    text = _COMPOUND_RE.sub(r"\1\2", text)
+    for token in tokenize(text):
+        if token in _FILLER:
+            continue
+        if len(token) > 4 and token.endswith(("ches", "shes", "xes")):
+            token = token[:-2]
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.add(_CANONICAL.get(token, token))
+    return frozenset(tokens)
+
+
+def minhash_signature(tokens):
+    hashes = [int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "big") for t in tokens]
+    return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def _bands(signature):
+    return [(i, signature[i:i + BAND_ROWS]) for i in range(0, len(signature), BAND_ROWS)]
+
+
+def jaccard(a, b):
+    union = len(a | b)
+    return len(a & b) / union if union else 0.0
+
+
+def differs_only_in_synonyms(a, b):
+    """
+    True when two normalized token sets are equal. normalize_tokens has already replaced synonyms
+    such as "prod" and "production" by one word, so any remaining difference, such as "enable"
+    against "disable", "staging" against "production" or a "not", changes the question.
+    """
+    return a == b
+
+
+def is_rewording(a, b, min_similarity=DEFAULT_MIN_SIMILARITY):
+    """
+    Whether two normalized questions can share an answer: similar enough and equal after synonym mapping.
+    """
+    return jaccard(a, b) >= min_similarity and differs_only_in_synonyms(a, b)
+
+
+def _normalize_url(url):
+    return url.rstrip(".,;:!?").rstrip("/")
+
+
+class AnswerRecorder:
+    """
+    Watches the events of one research turn and keeps the final answer plus the Confluence pages
+    and scraped URLs that the turn's tool calls returned.
+    """
+
+    def __init__(self, author):
+        self.author = author
+        self.answer = None
+        self.confluence_pages = {}
+        self.scraped_urls = set()
+        self.tool_failed = False
+
+    def observe(self, event):
+        if event.author != self.author or event.partial:
+            return
+        for function_response in event.get_function_responses():
+            self._record_tool_result(function_response.name, function_response.response or {})
+        if event.is_final_response() and event.content and event.content.parts:
+            text = "".join(part.text for part in event.content.parts if part.text and not part.thought)
+            if text.strip():
+                self.answer = text
+
+    def _record_tool_result(self, name, response):
+        if response.get("error"):
+            self.tool_failed = True
+            return
+        items = response.get("results") if isinstance(response.get("results"), list) else [response]
+        for item in items:
+            if not isinstance(item, dict) or "content" not in item:
+                continue
+            if name in CONFLUENCE_TOOLS and item.get("id") and item.get("version") is not None:
+                self.confluence_pages[str(item["id"])] = (item["version"], item.get("url", ""))
+            elif name in SCRAPE_TOOLS and item.get("url"):
+                self.scraped_urls.add(item["url"])
+
+    def sources(self):
+        """
+        Returns the sources the answer relies on, each with the validator it can be re-checked by
+        (Confluence page version, or the ETag/Last-Modified the scrape cache holds for a URL).
+
+        When the answer links to URLs only those are kept; otherwise every retrieved source is.
+        Returns None when the turn cannot be cached: no answer, a failed tool call, no sources,
+        or a source (such as a web search result that was never scraped) without a validator.
+        """
+        if not self.answer or self.tool_failed:
+            return None
+        known = {}
+        for content_id, (version, url) in self.confluence_pages.items():
+            known[_normalize_url(url) if url else f"confluence:{content_id}"] = {"type": "confluence", "id": content_id, "version": version}
+        scrape_cache = get_scrape_cache()
+        for url in self.scraped_urls:
+            entry = scrape_cache.get(url) if scrape_cache is not None else None
+            if entry is None or not (entry.get("etag") or entry.get("last_modified")):
+                known[_normalize_url(url)] = None
+            else:
+                known[_normalize_url(url)] = {"type": "web", "url": url, "etag": entry.get("etag"), "last_modified": entry.get("last_modified")}
+
+        cited = {_normalize_url(url) for url in _URL_IN_TEXT_RE.findall(self.answer)}
+        sources = [known.get(url) for url in cited] if cited else list(known.values())
+        if not sources or None in sources:
+            return None
+        return sources
+
+
+async def _confluence_unchanged(client, sources):
+    api_base, headers = confluence_config()
+    if not api_base:
+        return False
+    ids = [source["id"] for source in sources]
+    found = await collect_confluence_search(client, api_base, headers, f"id in ({','.join(ids)})", len(ids), expand="version")
+    current = {str(content_data.get("id")): content_data.get("version", {}).get("number") for content_data in found}
+    return all(current.get(source["id"]) == source["version"] for source in sources)
+
+
+async def _page_unchanged(client, source):
+    scrape_cache = get_scrape_cache()
+    entry = scrape_cache.get(source["url"]) if scrape_cache is not None else None
+    if entry is not None and scrape_cache.is_fresh(entry) and (entry.get("etag"), entry.get("last_modified")) == (source["etag"], source["last_modified"]):
+        return True
+    request_headers = {**SCRAPE_HEADERS, **ScrapeCache.conditional_headers(source)}
+    async with client.stream("GET", source["url"], headers=request_headers, timeout=SCRAPE_TIMEOUT) as response:
+        if response.status_code == 304:
+            return True
+        return response.is_success and source["etag"] is not None and response.headers.get("etag") == source["etag"]
+
+
+async def sources_unchanged(sources):
+    """
+    True when every Confluence source still has its recorded version (one batched `id in (...)`
+    query) and every web source answers a conditional GET with 304 or the same ETag.
+    """
+    client = get_http_client()
+    checks = [_page_unchanged(client, source) for source in sources if source["type"] == "web"]
+    confluence = [source for source in sources if source["type"] == "confluence"]
+    if confluence:
+        checks.append(_confluence_unchanged(client, confluence))
+    return all(await asyncio.gather(*checks))
+
+
+class AnswerCache:
+    """
+    TTL + LRU cache of final research answers keyed by the question's normalized token set.
+
+    A new question is matched against stored ones with MinHash LSH for candidates, then the
+    requirement that both normalize to the same words once synonyms are mapped, so rewordings hit while opposite or differently scoped questions ("enable" / "disable",
+    "production" / "staging") do not.
+    A matched answer is only served after its sources are re-checked: any changed Confluence page
+    version or web page ETag drops the entry and the question goes to the agent again.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, min_similarity=DEFAULT_MIN_SIMILARITY, validate_timeout=DEFAULT_VALIDATE_TIMEOUT):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.min_similarity = min_similarity
+        self.validate_timeout = validate_timeout
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band in _bands(entry["signature"]):
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+    def _match(self, tokens):
+        """
+        Returns the stored entry most similar to `tokens` above `min_similarity`, or None. Expired candidates are dropped.
+        """
+        signature = minhash_signature(tokens)
+        candidates = set()
+        for band in _bands(signature):
+            candidates |= self._buckets.get(band, set())
+        best, best_similarity = None, 0.0
+        now = time.monotonic()
+        for key in candidates:
+            entry = self._entries[key]
+            if now - entry["stored_at"] >= self.ttl:
+                self._remove(key)
+                self.stats["expired"] += 1
+                continue
+            similarity = jaccard(tokens, entry["tokens"])
+            if similarity > best_similarity and is_rewording(tokens, entry["tokens"], self.min_similarity):
+                best, best_similarity = entry, similarity
+        return best
+
+    def _record(self, result):
+        with self._lock:
+            self.stats[result] += 1
+        ANSWER_CACHE_LOOKUPS.inc(result={"hits": "hit", "misses": "miss"}.get(result, result))
+
+    async def lookup(self, question):
+        """
+        Returns the cached answer for `question` (or a near-duplicate of it) whose sources are unchanged, or None.
+        """
+        tokens = normalize_tokens(question)
+        if not tokens:
+            ANSWER_CACHE_LOOKUPS.inc(result="bypass")
+            return None
+        with span("answer_cache_lookup", kind="cache") as lookup_span:
+            with self._lock:
+                entry = self._match(tokens)
+            if entry is None:
+                self._record("misses")
+                lookup_span.set(result="miss")
+                return None
+
+            try:
+                with deadline_scope(self.validate_timeout):
+                    unchanged = await asyncio.wait_for(sources_unchanged(entry["sources"]), timeout=self.validate_timeout)
+            except (httpx.HTTPError, asyncio.TimeoutError) as e:
+                # Could not confirm the sources; answer normally but keep the entry for later.
+                logger.warning("Could not re-check the sources of a cached answer: %s", e or type(e).__name__)
+                self._record("misses")
+                lookup_span.set(result="unverified")
+                return None
+            except Exception:
+                # E.g. a ValueError from a response body that is not JSON; a cache must never fail the turn.
+                logger.exception("Unexpected error re-checking the sources of a cached answer")
+                self._record("misses")
+                lookup_span.set(result="unverified")
+                return None
+
+            if not unchanged:
+                with self._lock:
+                    if self._entries.get(entry["key"]) is entry:
+                        self._remove(entry["key"])
+                self._record("stale")
+                lookup_span.set(result="stale")
+                return None
+
+            with self._lock:
+                if entry["key"] in self._entries:
+                    self._entries.move_to_end(entry["key"])
+            self._record("hits")
+            lookup_span.set(result="hit", sources=len(entry["sources"]))
+            logger.debug("Answer cache hit for '%s' (stored for '%s').", question, entry["question"])
+            return entry["answer"]
+
+    def store(self, question, recorder):
+        """
+        Stores the answer `recorder` captured for `question` when all of its sources can be re-checked.
+        """
+        tokens = normalize_tokens(question)
+        sources = recorder.sources() if tokens else None
+        if sources is None:
+            ANSWER_CACHE_STORES.inc(result="skipped")
+            return False
+        key = " ".join(sorted(tokens))
+        entry = {
+            "key": key,
+            "question": question,
+            "tokens": tokens,
+            "signature": minhash_signature(tokens),
+            "answer": recorder.answer,
+            "sources": sources,
+            "stored_at": time.monotonic(),
+        }
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            for band in _bands(entry["signature"]):
+                self._buckets.setdefault(band, set()).add(key)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+        ANSWER_CACHE_STORES.inc(result="stored")
+        return True
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"] + stats["stale"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """
+    Returns the process-wide answer cache configured from ANSWER_CACHE_TTL, ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_MIN_SIMILARITY and ANSWER_CACHE_VALIDATE_TIMEOUT. Set ANSWER_CACHE_TTL or
+    ANSWER_CACHE_SIZE to 0 to disable it.
+    """
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            ttl = float(os.getenv("ANSWER_CACHE_TTL", DEFAULT_TTL))
+            max_entries = int(os.getenv("ANSWER_CACHE_SIZE", DEFAULT_MAX_ENTRIES))
+            if ttl <= 0 or max_entries <= 0:
+                return None
+            _answer_cache = AnswerCache(
+                max_entries=max_entries,
+                ttl=ttl,
+                min_similarity=float(os.getenv("ANSWER_CACHE_MIN_SIMILARITY", DEFAULT_MIN_SIMILARITY)),
+                validate_timeout=float(os.getenv("ANSWER_CACHE_VALIDATE_TIMEOUT", DEFAULT_VALIDATE_TIMEOUT)),
+            )
+        return _answer_cache
+
+
+# --- Offline evaluation ---
+
+# Labeled question pairs: True for rewordings that may share an answer, False for near misses that must not.
+EVAL_PAIRS = [
+    (True, "Which Kafka version are we running?", "What version of Kafka are we on?"),
+    (True, "How do I rotate the API key?", "How can I rotate an API key"),
+    (True, "Where is the prod database config?", "where is the production db configuration"),
+    (True, "What is the on-call rotation for the payments team?", "Who is in the payments team on-call rotation"),
+    (True, "How do I enable MFA on my account?", "how to enable 2FA for my account"),
+    (True, "Can you show me the deployment guide for the billing service?", "Deployment steps for the billing service"),
+    (True, "What are the coding standards for Python?", "Python coding standards"),
+    (True, "How do I delete a branch in the monorepo?", "how to remove branches from the monorepo"),
+    (True, "Where are the Kubernetes docs for the search cluster?", "search cluster k8s documentation"),
+    (True, "What is the latest release of the mobile app?", "What's the newest release of the mobile application?"),
+    (True, "How to set up the VPN on macOS?", "How do I setup the VPN on macOS"),
+    (True, "Who owns the checkout service?", "who is the owner of checkout service"),
+    (True, "Tell me the SLA for the ingestion pipeline", "What is the ingestion pipeline SLA?"),
+    (True, "How do I request access to the data warehouse?", "How can I get access to the data warehouse? how do I request it"),
+    (True, "What is the retention period for audit logs?", "audit log retention period"),
+    (True, "How do I fix the flaky integration tests in the CI?", "how to resolve flaky integration tests in CI"),
+    (False, "How do I enable MFA for my account?", "How do I disable MFA for my account?"),
+    (False, "Where is the production database config?", "Where is the staging database config?"),
+    (False, "Should we use feature flags for the rollout?", "Should we not use feature flags for the rollout?"),
+    (False, "Why does the build pass on main?", "Why doesn't the build pass on main?"),
+    (False, "How do I create a Jira project?", "How do I delete a Jira project?"),
+    (False, "What is the Kafka version in production?", "What is the Zookeeper version in production?"),
+    (False, "How do I add a user to the admin group?", "How do I remove a user from the admin group?"),
+    (False, "What is the retention period for audit logs?", "What is the retention period for access logs?"),
+    (False, "How do I start the search indexer?", "How do I stop the search indexer?"),
+    (False, "What is the on-call rotation for the payments team?", "What is the on-call rotation for the identity team?"),
+    (False, "How do I upgrade Postgres to version 15?", "How do I upgrade Postgres to version 16?"),
+    (False, "Which services use the old auth library?", "Which services use the new auth library?"),
+    (False, "Can I deploy on Fridays?", "Can I never deploy on Fridays?"),
+    (False, "How do I increase the Lambda timeout?", "How do I decrease the Lambda timeout?"),
+    (False, "What is the SLA for the ingestion pipeline?", "What is the SLA for the export pipeline?"),
+    (False, "How to configure SSO with Okta", "How to configure SSO without Okta"),
+]
+
+EVAL_THRESHOLDS = (0.3, 0.4, 0.5, 0.6, 0.75, 0.9)
+
+
+def evaluate(pairs=EVAL_PAIRS, thresholds=EVAL_THRESHOLDS):
+    """
+    Scores every labeled pair and reports, per similarity threshold, precision and recall of the
+    cache's matching (an LSH band collision, then is_rewording) and of the Jaccard threshold alone,
+    plus the pairs the default setting gets wrong.
+    """
+    scored = []
+    for expected, first, second in pairs:
+        a, b = normalize_tokens(first), normalize_tokens(second)
+        candidate = bool(set(_bands(minhash_signature(a))) & set(_bands(minhash_signature(b))))
+        scored.append((expected, jaccard(a, b) if candidate else 0.0, differs_only_in_synonyms(a, b), first, second))
+
+    def _rates(matches):
+        true_hits = sum(1 for (expected, *_), hit in zip(scored, matches) if hit and expected)
+        hits = sum(matches)
+        positives = sum(1 for expected, *_ in scored if expected)
+        return (true_hits / hits if hits else 1.0), (true_hits / positives if positives else 1.0)
+
+    rows = []
+    for threshold in thresholds:
+        precision, recall = _rates([similarity >= threshold and synonyms for _, similarity, synonyms, *_ in scored])
+        jaccard_precision, jaccard_recall = _rates([similarity >= threshold for _, similarity, *_ in scored])
+        rows.append((threshold, precision, recall, jaccard_precision, jaccard_recall))
+    wrong = [(expected, round(similarity, 2), first, second) for expected, similarity, synonyms, first, second in scored
+             if (similarity >= DEFAULT_MIN_SIMILARITY and synonyms) != expected]
+    return {"pairs": len(pairs), "rows": rows, "wrong_at_default": wrong}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate answer cache question matching on its labeled pairs.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("eval", help="Report precision and recall per similarity threshold.")
+    compare_parser = sub.add_parser("compare", help="Show how two questions normalize and whether they match.")
+    compare_parser.add_argument("first")
+    compare_parser.add_argument("second")
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        a, b = normalize_tokens(args.first), normalize_tokens(args.second)
+        print(sorted(a), sorted(b))
+        print(f"jaccard: {jaccard(a, b):.3f}  same words: {differs_only_in_synonyms(a, b)}  match: {is_rewording(a, b)}")
+        return
+
+    report = evaluate()
+    print(f"pairs: {report['pairs']}")
+    print(f"{'threshold':>10}{'precision':>11}{'recall':>8}{'jaccard-only precision':>24}{'recall':>8}")
+    for threshold, precision, recall, jaccard_precision, jaccard_recall in report["rows"]:
+        marker = "  (default)" if threshold == DEFAULT_MIN_SIMILARITY else ""
+        print(f"{threshold:>10.2f}{precision:>11.3f}{recall:>8.3f}{jaccard_precision:>24.3f}{jaccard_recall:>8.3f}{marker}")
+    for expected, similarity, first, second in report["wrong_at_default"]:
+        print(f"  {'missed' if expected else 'false match'} ({similarity}): {first!r} / {second!r}")
+
+
+if __name__ == "__main__":
+    main()
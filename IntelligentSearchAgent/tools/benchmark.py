@@ -0,0 +1,798 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import hashlib
+import tempfile
+import statistics
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Stand-in servers: a Confluence REST stub over a fixture space, a Tavily-compatible /search stub
+# and a static HTML corpus server, all with injectable latency and faults (error statuses with
+# Retry-After, hung responses). The benchmark runs them in a child process so their CPU and memory
+# do not count against the tools being measured.
+
+FIXTURE_SPACE = "BENCH"
+FIXTURE_FIRST_ID = 100000
+SCENARIOS = ("confluence_search", "web_search", "scrape", "create_page")
+DEFAULT_TOLERANCE = 0.10
+# Runs per scenario; the report keeps the median of each metric and the per-run samples.
+DEFAULT_REPEATS = 3
+# Absolute changes below these never count as regressions, whatever the relative change.
+NOISE_FLOORS = {"p50_ms": 2.0, "p95_ms": 5.0, "p99_ms": 10.0, "throughput_rps": 5.0, "peak_rss_mb": 2.0}
+# Below this many measured requests per run p95/p99 rest on one or two samples; they are shown but not compared.
+MIN_TAIL_REQUESTS = 100
+
+_TEXT_CQL_RE = r'text ~ "(.*)"'
+_ID_CQL_RE = r"id in \(([^)]*)\)"
+_SPACE_CQL_RE = r'space = "([^"]+)"'
+_TITLE_CQL_RE = r"title in \((.*)\)"
+_CQL_STRING_RE = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+
+def build_fixture_space(n_pages, seed=7):
+    """
+    Returns {id: page} for `n_pages` synthetic Confluence pages drawn from the mirror benchmark vocabulary.
+    """
+    from .confluence_mirror import _BENCH_VOCAB
+    rng = random.Random(seed)
+    pages = {}
+    for i in range(n_pages):
+        words = rng.choices(_BENCH_VOCAB, k=rng.randint(150, 900))
+        content_id = str(FIXTURE_FIRST_ID + i)
+        pages[content_id] = {
+            "id": content_id,
+            "title": " ".join(rng.sample(_BENCH_VOCAB, 3)).title(),
+            "html": "".join(f"<p>{' '.join(words[j:j + 30])}</p>" for j in range(0, len(words), 30)),
+            "terms": frozenset(words),
+            "space": FIXTURE_SPACE,
+            "version": 1,
+        }
+    return pages
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _delay(self):
+        """
+        Sleeps for the injected latency, then injects a fault with the configured probabilities.
+        Returns True when a fault response was sent and the handler should stop.
+        """
+        latency = self.server.latency + random.uniform(0, self.server.jitter)
+        if latency > 0:
+            time.sleep(latency)
+        faults = self.server.faults
+        roll = random.random()
+        if roll < faults["hang_rate"]:
+            time.sleep(faults["hang_seconds"])
+        elif roll < faults["hang_rate"] + faults["error_rate"]:
+            # Drain the request body so the keep-alive connection stays usable.
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            body = json.dumps({"message": "Injected fault"}).encode("utf-8")
+            self.send_response(faults["status"])
+            if faults["retry_after"] is not None:
+                self.send_header("Retry-After", str(faults["retry_after"]))
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return True
+        return False
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ConfluenceStubHandler(_StubHandler):
+    """
+    Serves /wiki/rest/api/content/search (text ~, id in, title in and space CQL with start/limit
+    cursors), GET /wiki/rest/api/content/{id}, and POST/PUT /wiki/rest/api/content for page
+    creation and versioned updates over the fixture space, plus content properties (set through
+    metadata.properties on create or /content/{id}/property, read with expand=metadata.properties.<key>).
+    """
+
+    def _content(self, page, expand):
+        data = {
+            "id": page["id"],
+            "type": "page",
+            "title": page["title"],
+            "space": {"key": page["space"]},
+            "_links": {"webui": f"/spaces/{page['space']}/pages/{page['id']}"},
+        }
+        if "version" in expand:
+            data["version"] = {"number": page["version"]}
+        if "body.view" in expand:
+            data["body"] = {"view": {"value": page["html"], "representation": "view"}}
+        if "body.storage" in expand:
+            data.setdefault("body", {})["storage"] = {"value": page["html"], "representation": "storage"}
+        for key in re.findall(r"metadata\.properties\.([\w-]+)", expand):
+            if key in page.get("properties", {}):
+                data.setdefault("metadata", {}).setdefault("properties", {})[key] = page["properties"][key]
+        return data
+
+    def _match(self, cql):
+        with self.server.lock:
+            pages = dict(self.server.pages)
+        if match := re.search(_ID_CQL_RE, cql):
+            return [pages[cid.strip()] for cid in match.group(1).split(",") if cid.strip() in pages]
+        if match := re.search(_TEXT_CQL_RE, cql):
+            terms = match.group(1).lower().split()
+            scored = [(sum(term in page["terms"] for term in terms), page) for page in pages.values()]
+            return [page for score, page in sorted(scored, key=lambda item: -item[0]) if score]
+        space = match.group(1) if (match := re.search(_SPACE_CQL_RE, cql)) else None
+        if match := re.search(_TITLE_CQL_RE, cql):
+            titles = {re.sub(r"\\(.)", r"\1", t).casefold() for t in _CQL_STRING_RE.findall(match.group(1))}
+            return [page for page in pages.values() if page["title"].casefold() in titles and page["space"] == space]
+        return [page for page in pages.values() if page["space"] == space]
+
+    def do_GET(self):
+        if self._delay():
+            return
+        parsed = urlsplit(self.path)
+        params = dict(parse_qsl(parsed.query))
+        expand = params.get("expand", "")
+        if parsed.path == "/wiki/rest/api/content/search":
+            start = int(params.get("start", 0))
+            limit = int(params.get("limit", 25))
+            matches = self._match(params.get("cql", ""))
+            links = {}
+            if start + limit < len(matches):
+                links["next"] = "/rest/api/content/search?" + urlencode({**params, "start": start + limit})
+            self._send_json({
+                "results": [self._content(page, expand) for page in matches[start:start + limit]],
+                "start": start,
+                "limit": limit,
+                "size": len(matches[start:start + limit]),
+                "_links": links,
+            })
+        elif parsed.path.startswith("/wiki/rest/api/content/"):
+            page = self.server.pages.get(parsed.path.rsplit("/", 1)[-1])
+            if page is None:
+                self._send_json({"message": "No content found"}, status=404)
+            else:
+                self._send_json(self._content(page, expand))
+        else:
+            self._send_json({"message": "Not found"}, status=404)
+
+    def _set_property(self, content_id, key, prop, create):
+        with self.server.lock:
+            page = self.server.pages.get(content_id)
+            if page is None:
+                return 404, {"message": "No content found"}
+            current = page.get("properties", {}).get(key)
+            number = 1 if create else (current or {}).get("version", {}).get("number", 0) + 1
+            if (current is not None) == create or prop.get("version", {}).get("number", 1) != number:
+                return 409, {"message": "Property version conflict"}
+            stored = {"key": key, "value": prop.get("value"), "version": {"number": number}}
+            self.server.pages[content_id] = {**page, "properties": {**page.get("properties", {}), key: stored}}
+        return 200, stored
+
+    def do_POST(self):
+        if self._delay():
+            return
+        if match := re.fullmatch(r"/wiki/rest/api/content/(\w+)/property", urlsplit(self.path).path):
+            prop = self._read_json()
+            status, payload = self._set_property(match.group(1), prop.get("key", ""), prop, create=True)
+            self._send_json(payload, status=status)
+            return
+        if urlsplit(self.path).path != "/wiki/rest/api/content":
+            self._send_json({"message": "Not found"}, status=404)
+            return
+        page_data = self._read_json()
+        space = page_data.get("space", {}).get("key")
+        title = page_data.get("title", "")
+        with self.server.lock:
+            if any(p["space"] == space and p["title"].casefold() == title.casefold() for p in self.server.pages.values()):
+                page = None
+            else:
+                content_id = str(FIXTURE_FIRST_ID + len(self.server.pages))
+                html = page_data.get("body", {}).get("storage", {}).get("value", "")
+                properties = {key: {"key": key, "value": prop.get("value"), "version": {"number": 1}}
+                              for key, prop in page_data.get("metadata", {}).get("properties", {}).items()}
+                page = self.server.pages[content_id] = {
+                    "id": content_id, "space": space, "title": title, "html": html,
+                    "terms": frozenset(re.findall(r"[a-z0-9]+", html.lower())), "version": 1, "properties": properties,
+                }
+        if page is None:
+            self._send_json({"message": "A page with this title already exists"}, status=400)
+        else:
+            self._send_json(self._content(page, "version"))
+
+    def do_PUT(self):
+        if self._delay():
+            return
+        if match := re.fullmatch(r"/wiki/rest/api/content/(\w+)/property/([\w-]+)", urlsplit(self.path).path):
+            status, payload = self._set_property(match.group(1), match.group(2), self._read_json(), create=False)
+            self._send_json(payload, status=status)
+            return
+        page_data = self._read_json()
+        content_id = urlsplit(self.path).path.rsplit("/", 1)[-1]
+        with self.server.lock:
+            page = self.server.pages.get(content_id)
+            if page is not None and page_data.get("version", {}).get("number") == page["version"] + 1:
+                html = page_data.get("body", {}).get("storage", {}).get("value", "")
+                page = self.server.pages[content_id] = {**page, "title": page_data.get("title", page["title"]), "html": html,
+                                                        "version": page["version"] + 1}
+                status = 200
+            else:
+                status = 404 if page is None else 409
+        if status == 200:
+            self._send_json(self._content(page, "version"))
+        else:
+            self._send_json({"message": "Version conflict" if status == 409 else "No content found"}, status=status)
+
+
+class TavilyStubHandler(_StubHandler):
+    """
+    Answers POST /search in the shape of the Tavily API with `max_results` synthetic results.
+    """
+
+    def do_POST(self):
+        if self._delay():
+            return
+        request = self._read_json()
+        query = request.get("query", "")
+        slug = hashlib.sha1(query.encode("utf-8")).hexdigest()[:10]
+        results = [
+            {
+                "title": f"{query.title()} - result {i}",
+                "url": f"https://example.com/{slug}/{i}",
+                "content": f"Synthetic snippet {i} about {query}. " * 8,
+                "score": round(1 - i / 10, 2),
+            }
+            for i in range(1, int(request.get("max_results", 5)) + 1)
+        ]
+        self._send_json({"query": query, "results": results, "response_time": 0.0})
+
+
+class HtmlCorpusHandler(_StubHandler):
+    """
+    Serves the .html files of a corpus directory with an ETag, honouring If-None-Match.
+    """
+
+    def do_GET(self):
+        if self._delay():
+            return
+        name = os.path.basename(urlsplit(self.path).path)
+        path = os.path.join(self.server.corpus_dir, name)
+        if not name or not os.path.isfile(path):
+            self._send_json({"message": "Not found"}, status=404)
+            return
+        etag = f'"{int(os.path.getmtime(path))}-{os.path.getsize(path)}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(os.path.getsize(path)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        try:
+            with open(path, "rb") as f:
+                while chunk := f.read(64 * 1024):
+                    self.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            # Streaming extraction closes the connection once it has enough text.
+            pass
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections at benchmark concurrency and shows up as 1s SYN retries.
+    request_queue_size = 256
+
+
+def fault_profile(error_rate=0.0, status=503, retry_after=None, hang_rate=0.0, hang_seconds=60.0):
+    """
+    Fault injection settings for the stubs: `error_rate` of responses get `status` (with Retry-After
+    when given) and `hang_rate` of them stall for `hang_seconds` before answering.
+    """
+    return {"error_rate": error_rate, "status": status, "retry_after": retry_after,
+            "hang_rate": hang_rate, "hang_seconds": hang_seconds}
+
+
+def start_stub_server(handler, latency_ms=0.0, jitter_ms=0.0, faults=None, **state):
+    import threading
+    server = _StubServer(("127.0.0.1", 0), handler)
+    server.latency = latency_ms / 1000
+    server.jitter = jitter_ms / 1000
+    server.faults = faults or fault_profile()
+    server.lock = threading.Lock()
+    for key, value in state.items():
+        setattr(server, key, value)
+    threading.Thread(target=server.serve_forever, name=f"stub-{handler.__name__}", daemon=True).start()
+    return server
+
+
+def serve_stubs(corpus_dir, n_pages, latency_ms, jitter_ms, faults=None):
+    """
+    Starts the three stand-in servers, prints their ports as one JSON line and blocks.
+    """
+    servers = {
+        "confluence": start_stub_server(ConfluenceStubHandler, latency_ms, jitter_ms, faults, pages=build_fixture_space(n_pages)),
+        "tavily": start_stub_server(TavilyStubHandler, latency_ms, jitter_ms, faults),
+        "web": start_stub_server(HtmlCorpusHandler, latency_ms, jitter_ms, faults, corpus_dir=corpus_dir),
+    }
+    print(json.dumps({name: server.server_port for name, server in servers.items()}), flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+# --- Load driver ---
+
+def peak_rss_mb():
+    """
+    Peak RSS of this process. run_benchmark drives every scenario in its own process, so this is per scenario.
+    On Linux this reads VmHWM, because ru_maxrss keeps the parent's peak across fork and exec.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(latencies_ms, errors, wall_seconds):
+    if len(latencies_ms) > 1:
+        cuts = statistics.quantiles(latencies_ms, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies_ms[0] if latencies_ms else 0.0
+    return {
+        "requests": len(latencies_ms),
+        "errors": errors,
+        "p50_ms": round(p50, 2),
+        "p95_ms": round(p95, 2),
+        "p99_ms": round(p99, 2),
+        "throughput_rps": round(len(latencies_ms) / wall_seconds, 2) if wall_seconds else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def drive(calls, concurrency, warmup=0):
+    """
+    Awaits every zero-argument coroutine factory in `calls` with at most `concurrency` in flight.
+    The first `warmup` calls are run first and left out of the numbers.
+    """
+    for call in calls[:warmup]:
+        await call()
+    calls = calls[warmup:]
+    slots = asyncio.Semaphore(max(1, concurrency))
+    latencies = []
+    errors = 0
+
+    async def _one(call):
+        nonlocal errors
+        async with slots:
+            started = time.perf_counter()
+            result = await call()
+            latencies.append((time.perf_counter() - started) * 1000)
+        if isinstance(result, dict) and result.get("error"):
+            errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_one(call) for call in calls))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def _scenario_calls(scenario, ports, corpus_files, n_requests, seed):
+    from .confluence_mirror import _BENCH_VOCAB
+    from .internal_confluence_search import internal_confluence_search_async
+    from .external_web_search import external_web_search_async
+    from .scrape_webpage_content import scrape_webpage_content_async
+    from .create_confluence_page import create_confluence_page_document_async
+
+    rng = random.Random(seed)
+    if scenario == "confluence_search":
+        queries = [" ".join(rng.sample(_BENCH_VOCAB, 2)) for _ in range(n_requests)]
+        return {scenario: [lambda q=q: internal_confluence_search_async(q) for q in queries]}
+    if scenario == "web_search":
+        queries = [" ".join(rng.sample(_BENCH_VOCAB, 3)) for _ in range(n_requests)]
+        return {scenario: [lambda q=q: external_web_search_async(q) for q in queries]}
+    if scenario == "scrape":
+        calls = {}
+        for name in corpus_files:
+            url = f"http://127.0.0.1:{ports['web']}/{name}"
+            calls[f"scrape_{os.path.splitext(name)[0].removeprefix('page_')}"] = [
+                lambda url=url: scrape_webpage_content_async(url) for _ in range(n_requests)
+            ]
+        return calls
+    if scenario == "create_page":
+        return {scenario: [
+            lambda i=i: create_confluence_page_document_async(FIXTURE_SPACE, f"Benchmark page {seed}-{i}", "Created by the offline benchmark.")
+            for i in range(n_requests)
+        ]}
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def configure_environment(ports, no_cache):
+    """
+    Points the tools at the stand-in servers. With `no_cache` the page, scrape and Tavily caches are disabled.
+    """
+    os.environ.update({
+        "CONFLUENCE_API_BASE": f"http://127.0.0.1:{ports['confluence']}/wiki/rest/api",
+        "CONFLUENCE_API_TOKEN": "benchmark",
+        "CONFLUENCE_USER_EMAIL": "benchmark@example.com",
+        "CONFLUENCE_MIRROR_DIR": "",
+        "TAVILY_API_KEY": "tvly-benchmark",
+        "TAVILY_API_BASE_URL": f"http://127.0.0.1:{ports['tavily']}",
+    })
+    if no_cache:
+        os.environ.update({"CONFLUENCE_PAGE_CACHE_MB": "0", "SCRAPE_CACHE_MB": "0", "TAVILY_CACHE_TTL": "0"})
+
+
+def _fault_args(faults):
+    faults = faults or fault_profile()
+    args = ["--error-rate", str(faults["error_rate"]), "--fault-status", str(faults["status"]),
+            "--hang-rate", str(faults["hang_rate"]), "--hang-seconds", str(faults["hang_seconds"])]
+    if faults["retry_after"] is not None:
+        args += ["--retry-after", str(faults["retry_after"])]
+    return args
+
+
+def _corpus_files(corpus_dir):
+    return sorted((n for n in os.listdir(corpus_dir) if n.endswith((".html", ".htm"))),
+                  key=lambda n: os.path.getsize(os.path.join(corpus_dir, n)))
+
+
+def run_scenario(scenario, name, ports, corpus_dir, n_requests, concurrency, warmup, seed, no_cache):
+    """
+    Drives one named scenario against already running stubs; `run-scenario` runs this in a child process.
+    """
+    configure_environment(ports, no_cache)
+    calls = _scenario_calls(scenario, ports, _corpus_files(corpus_dir), n_requests + warmup, seed)[name]
+    return asyncio.run(drive(calls, concurrency, warmup))
+
+
+def _combine_runs(runs):
+    """
+    Folds the stats of repeated runs of one scenario into their medians, with the per-run values under "samples".
+    """
+    combined = {"requests": sum(run["requests"] for run in runs), "errors": sum(run["errors"] for run in runs)}
+    samples = {}
+    for metric in _LOWER_IS_BETTER + _HIGHER_IS_BETTER:
+        values = [run[metric] for run in runs if run.get(metric) is not None]
+        combined[metric] = round(statistics.median(values), 2) if values else None
+        samples[metric] = values
+    combined["samples"] = samples
+    return combined
+
+
+def run_benchmark(scenarios=SCENARIOS, n_requests=100, concurrency=8, latency_ms=20.0, jitter_ms=10.0,
+                  n_pages=500, corpus_dir=None, no_cache=False, warmup=3, seed=13, faults=None, repeats=DEFAULT_REPEATS):
+    """
+    Runs each scenario `repeats` times against freshly started stand-in servers and returns
+    {"config", "scenarios"} with the median of every metric. Every run is driven in its own process,
+    so its caches start cold and `peak_rss_mb` is its own.
+    """
+    from .html_extract import _write_synthetic_corpus
+
+    tmp_dir = None
+    if corpus_dir is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        corpus_dir = tmp_dir.name
+        _write_synthetic_corpus(corpus_dir)
+    corpus_files = _corpus_files(corpus_dir)
+
+    package_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    stub_env = {**os.environ, "TOOLS_METRICS_PORT": "", "PYTHONPATH": os.pathsep.join(filter(None, [package_root, os.getenv("PYTHONPATH")]))}
+    stub_process = subprocess.Popen(
+        [sys.executable, "-m", __spec__.name, "serve-stubs", "--corpus", corpus_dir, "--pages", str(n_pages),
+         "--latency-ms", str(latency_ms), "--jitter-ms", str(jitter_ms), *_fault_args(faults)],
+        stdout=subprocess.PIPE, text=True, env=stub_env,
+    )
+    try:
+        ports = json.loads(stub_process.stdout.readline())
+        results = {}
+        for scenario in scenarios:
+            for name in _scenario_calls(scenario, ports, corpus_files, 0, seed):
+                runs = []
+                for repeat in range(max(1, repeats)):
+                    # A different seed per run varies the queries and keeps created page titles unique.
+                    child = subprocess.run(
+                        [sys.executable, "-m", __spec__.name, "run-scenario", scenario, name, "--ports", json.dumps(ports),
+                         "--corpus", corpus_dir, "--requests", str(n_requests), "--concurrency", str(concurrency),
+                         "--warmup", str(warmup), "--seed", str(seed + repeat), *(["--no-cache"] if no_cache else [])],
+                        stdout=subprocess.PIPE, text=True, env=stub_env, check=True,
+                    )
+                    runs.append(json.loads(child.stdout.strip().splitlines()[-1]))
+                results[name] = _combine_runs(runs)
+    finally:
+        stub_process.terminate()
+        stub_process.wait()
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+    config = {"requests": n_requests, "repeats": max(1, repeats), "concurrency": concurrency, "latency_ms": latency_ms, "jitter_ms": jitter_ms,
+              "pages": n_pages, "no_cache": no_cache, "faults": faults or fault_profile(), "python": sys.version.split()[0]}
+    return {"config": config, "scenarios": results}
+
+
+# --- Resilience checks ---
+
+def check_resilience():
+    """
+    Exercises ResilientTransport against a fault-injecting HTML stub: Retry-After on 429, a hung
+    backend cut off by the deadline, the breaker opening and its half-open probe, and cancellation
+    of in-flight (hedged) attempts. Returns a list of (check, passed, detail).
+    """
+    import httpx
+    from .resilience import ResilientTransport, CircuitOpenError, deadline_scope, get_circuit_breaker
+
+    os.environ.update({"CIRCUIT_MIN_REQUESTS": "4", "CIRCUIT_FAILURE_RATIO": "0.5", "CIRCUIT_RESET_SECONDS": "0.3"})
+    corpus = tempfile.TemporaryDirectory()
+    with open(os.path.join(corpus.name, "page.html"), "w", encoding="utf-8") as f:
+        f.write("<html><body><main><p>Resilience check page.</p></main></body></html>")
+
+    def _client(faults, **transport_args):
+        server = start_stub_server(HtmlCorpusHandler, faults=faults, corpus_dir=corpus.name)
+        transport = ResilientTransport(httpx.AsyncHTTPTransport(), **transport_args)
+        client = httpx.AsyncClient(transport=transport, base_url=f"http://127.0.0.1:{server.server_port}", timeout=10)
+        return server, transport, client
+
+    async def _other_tasks():
+        await asyncio.sleep(0.05)
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    async def retry_after():
+        server, transport, client = _client(fault_profile(error_rate=1.0, status=429, retry_after=0.3), max_retries=2, backoff=0.01)
+        async with client:
+            started = time.perf_counter()
+            response = await client.get("/page.html")
+            waited = time.perf_counter() - started
+            transport.retry_after_max = 0.1
+            started = time.perf_counter()
+            await client.get("/page.html")
+            capped = time.perf_counter() - started
+        server.shutdown()
+        passed = response.status_code == 429 and waited >= 0.6 and capped < 0.3
+        return passed, f"two retries waited {waited:.2f}s; Retry-After above the cap returned after {capped:.2f}s"
+
+    async def hang_deadline():
+        server, _, client = _client(fault_profile(hang_rate=1.0, hang_seconds=3.0), max_retries=2, backoff=0.01)
+        async with client:
+            started = time.perf_counter()
+            try:
+                with deadline_scope(0.5):
+                    await client.get("/page.html")
+                outcome = "answered"
+            except httpx.TimeoutException:
+                outcome = "timed out"
+            elapsed = time.perf_counter() - started
+        server.shutdown()
+        return outcome == "timed out" and elapsed < 1.0, f"{outcome} after {elapsed:.2f}s with a 0.5s deadline"
+
+    async def breaker():
+        faults = fault_profile(error_rate=1.0, status=503)
+        server, _, client = _client(faults, max_retries=0)
+        circuit = get_circuit_breaker(f"127.0.0.1:{server.server_port}")
+        states = []
+        async with client:
+            for _ in range(4):
+                await client.get("/page.html")
+            try:
+                await client.get("/page.html")
+                states.append("not rejected")
+            except CircuitOpenError:
+                states.append("rejected")
+            await asyncio.sleep(0.35)
+            await client.get("/page.html")
+            states.append(circuit.state)
+            faults["error_rate"] = 0.0
+            await asyncio.sleep(0.35)
+            response = await client.get("/page.html")
+            states.append(f"{circuit.state}/{response.status_code}")
+        server.shutdown()
+        return states == ["rejected", "open", "closed/200"], "open -> " + ", failed probe -> ".join(states[:2]) + ", good probe -> " + states[2]
+
+    async def hedge_cancel():
+        details = []
+        passed = True
+        for label, hedge_after in (("before the hedge", 1.0), ("after the hedge", 0.05)):
+            server, _, client = _client(fault_profile(hang_rate=1.0, hang_seconds=2.0), max_retries=0, hedge_after=hedge_after)
+            async with client:
+                call = asyncio.ensure_future(client.get("/page.html"))
+                await asyncio.sleep(0.2)
+                call.cancel()
+                try:
+                    await call
+                except asyncio.CancelledError:
+                    pass
+                leftover = await _other_tasks()
+            server.shutdown()
+            passed = passed and not leftover
+            details.append(f"cancelled {label}: {len(leftover)} attempt(s) left running")
+        return passed, "; ".join(details)
+
+    async def _run_all():
+        results = []
+        for check in (retry_after, hang_deadline, breaker, hedge_cancel):
+            passed, detail = await check()
+            results.append((check.__name__, passed, detail))
+        return results
+
+    try:
+        return asyncio.run(_run_all())
+    finally:
+        corpus.cleanup()
+
+
+# --- Reporting and baseline comparison ---
+
+_LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "peak_rss_mb")
+_HIGHER_IS_BETTER = ("throughput_rps",)
+
+
+def compare_to_baseline(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Returns (rows, regressions). Each row is (scenario, metric, baseline, current, relative change).
+    A regression is a latency/RSS increase or throughput drop of the median that is beyond `tolerance`,
+    larger than the metric's NOISE_FLOORS entry and, when both reports have per-run samples, seen in
+    every run: each current run must be worse than each baseline run. p95/p99 only count when both
+    reports measured at least MIN_TAIL_REQUESTS requests per run.
+    """
+    rows, regressions = [], []
+    per_run = min(report.get("config", {}).get("requests", 0), baseline.get("config", {}).get("requests", 0))
+    tails_comparable = per_run >= MIN_TAIL_REQUESTS
+    for scenario, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if previous is None:
+            continue
+        for metric in _LOWER_IS_BETTER + _HIGHER_IS_BETTER:
+            before, after = previous.get(metric), current.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            rows.append((scenario, metric, before, after, change))
+            lower_is_better = metric in _LOWER_IS_BETTER
+            worse = change > tolerance if lower_is_better else change < -tolerance
+            worse = worse and abs(after - before) > NOISE_FLOORS.get(metric, 0.0)
+            worse = worse and (tails_comparable or metric not in ("p95_ms", "p99_ms"))
+            baseline_samples = previous.get("samples", {}).get(metric)
+            current_samples = current.get("samples", {}).get(metric)
+            if worse and baseline_samples and current_samples:
+                # Every run must be worse than every baseline run; overlapping runs are indistinguishable from noise.
+                if lower_is_better:
+                    worse = min(current_samples) > max(baseline_samples)
+                else:
+                    worse = max(current_samples) < min(baseline_samples)
+            if worse:
+                regressions.append((scenario, metric, before, after, change))
+    return rows, regressions
+
+
+def print_report(report):
+    columns = ("requests", "errors", "p50_ms", "p95_ms", "p99_ms", "throughput_rps", "peak_rss_mb")
+    print(f"{'scenario':<22}" + "".join(f"{c:>16}" for c in columns))
+    for scenario, stats in report["scenarios"].items():
+        print(f"{scenario:<22}" + "".join(f"{str(stats.get(c)):>16}" for c in columns))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the search, scrape and page-creation tools against local stand-in servers.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Run the benchmark scenarios and optionally compare with a baseline.")
+    run_parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    run_parser.add_argument("--requests", type=int, default=100, help="Measured requests per scenario")
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument("--latency-ms", type=float, default=20.0, help="Latency injected by every stub response")
+    run_parser.add_argument("--jitter-ms", type=float, default=10.0, help="Extra uniform random latency per response")
+    run_parser.add_argument("--pages", type=int, default=500, help="Pages in the fixture Confluence space")
+    run_parser.add_argument("--corpus", help="Directory of .html files (default: generate a synthetic 50KB-8MB corpus)")
+    run_parser.add_argument("--no-cache", action="store_true", help="Disable the page, scrape and Tavily caches")
+    run_parser.add_argument("--warmup", type=int, default=3)
+    run_parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="Runs per scenario; medians are reported")
+    run_parser.add_argument("--json", help="Write the report to this file")
+    run_parser.add_argument("--baseline", help="Compare with a report saved by --json")
+    run_parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed relative regression (default 0.10)")
+
+    stub_parser = sub.add_parser("serve-stubs", help="Only start the stand-in servers and print their ports.")
+    stub_parser.add_argument("--corpus", required=True)
+    stub_parser.add_argument("--pages", type=int, default=500)
+    stub_parser.add_argument("--latency-ms", type=float, default=0.0)
+    stub_parser.add_argument("--jitter-ms", type=float, default=0.0)
+
+    scenario_parser = sub.add_parser("run-scenario", help="Drive one named scenario against running stubs (used by run).")
+    scenario_parser.add_argument("scenario", choices=SCENARIOS)
+    scenario_parser.add_argument("name", help="Scenario entry, e.g. scrape_500kb")
+    scenario_parser.add_argument("--ports", required=True, help="JSON ports printed by serve-stubs")
+    scenario_parser.add_argument("--corpus", required=True)
+    scenario_parser.add_argument("--requests", type=int, default=100)
+    scenario_parser.add_argument("--concurrency", type=int, default=8)
+    scenario_parser.add_argument("--warmup", type=int, default=3)
+    scenario_parser.add_argument("--seed", type=int, default=13)
+    scenario_parser.add_argument("--no-cache", action="store_true")
+
+    sub.add_parser("check-resilience", help="Check retries, deadlines, the circuit breaker and hedging against a faulty stub.")
+
+    for fault_parser in (run_parser, stub_parser):
+        fault_parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of responses replaced by --fault-status")
+        fault_parser.add_argument("--fault-status", type=int, default=503)
+        fault_parser.add_argument("--retry-after", type=float, help="Retry-After seconds sent with injected errors")
+        fault_parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of responses that stall for --hang-seconds")
+        fault_parser.add_argument("--hang-seconds", type=float, default=60.0)
+    args = parser.parse_args(argv)
+    if args.command == "run-scenario":
+        stats = run_scenario(args.scenario, args.name, json.loads(args.ports), args.corpus, args.requests,
+                             args.concurrency, args.warmup, args.seed, args.no_cache)
+        print(json.dumps(stats))
+        return 0
+    if args.command == "check-resilience":
+        results = check_resilience()
+        for name, passed, detail in results:
+            print(f"{'ok' if passed else 'FAIL':<6}{name:<16}{detail}")
+        return 0 if all(passed for _, passed, _ in results) else 1
+    faults = fault_profile(args.error_rate, args.fault_status, args.retry_after, args.hang_rate, args.hang_seconds)
+
+    if args.command == "serve-stubs":
+        serve_stubs(args.corpus, args.pages, args.latency_ms, args.jitter_ms, faults)
+        return 0
+
+    report = run_benchmark(args.scenarios, args.requests, args.concurrency, args.latency_ms, args.jitter_ms,
+                           args.pages, args.corpus, args.no_cache, args.warmup, faults=faults, repeats=args.repeats)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    rows, regressions = compare_to_baseline(report, baseline, args.tolerance)
+    print(f"\nCompared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+    differing = sorted(k for k, v in report["config"].items() if baseline.get("config", {}).get(k) != v)
+    if differing:
+        print(f"  note: baseline was recorded with different settings for {', '.join(differing)}")
+    if min(args.requests, baseline.get("config", {}).get("requests", 0)) < MIN_TAIL_REQUESTS:
+        print(f"  note: fewer than {MIN_TAIL_REQUESTS} requests per run, p95/p99 are not checked for regressions")
+    for scenario, metric, before, after, change in rows:
+        print(f"  {scenario:<22}{metric:<16}{before:>12}{after:>12}{change:>+10.1%}")
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed beyond tolerance.")
+        return 1
+    print("No regressions beyond tolerance.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import asyncio
+from bs4 import BeautifulSoup
+from urllib.parse import urlencode
+from .telemetry import get_logger
+
+
+logger = get_logger(__name__)
+
+
+# Number of results requested per page of the cursor-paginated search.
+SEARCH_PAGE_SIZE = 25
+# Upper bound on concurrent batched body fetches for pages the search returned without a body.
+DEFAULT_FETCH_CONCURRENCY = 8
+
+
+def html_to_text(raw_html_content):
+    """
+    Extracts the readable text from a Confluence body.view HTML fragment.
+    """
+    return BeautifulSoup(raw_html_content, "html.parser").get_text(separator="\n", strip=True)
+
+
+def page_url(api_base, content_data):
+    """
+    Builds the browser URL for a Confluence content object from its `_links.webui`.
+    """
+    webui_link = content_data.get("_links", {}).get("webui")
+    if webui_link:
+        return f"{api_base.split('/wiki')[0]}/wiki{webui_link}"
+    return ""
+
+
+async def iter_confluence_search(client, api_base, headers, cql, limit, page_size=SEARCH_PAGE_SIZE, expand="body.view,version"):
+    """
+    Yields search results for `cql` with `expand` (body.view and version by default) inlined,
+    following the cursor in `_links.next` until `limit` results have been produced.
+    """
+    url = f"{api_base}/content/search"
+    params = {
+        "cql": cql,
+        "limit": min(limit, page_size),
+        "expand": expand,
+    }
+    site_base = api_base.split("/rest/api")[0]
+    produced = 0
+
+    while url and produced < limit:
+        logger.debug("Confluence search URL: %s?%s", url, urlencode(params) if params else "")
+        search_response = await client.get(url, headers=headers, params=params)
+        search_response.raise_for_status()
+        search_data = search_response.json()
+
+        page_results = search_data.get("results", [])
+        logger.debug("Number of results in search page: %d", len(page_results))
+        for result in page_results:
+            if produced >= limit:
+                return
+            produced += 1
+            yield result
+
+        next_link = search_data.get("_links", {}).get("next")
+        if not next_link or not page_results:
+            return
+        # `next` is relative to the site base and already carries the cursor and the original params.
+        url = f"{site_base}{next_link}" if next_link.startswith("/") else next_link
+        params = None
+
+
+async def collect_confluence_search(client, api_base, headers, cql, limit, **kwargs):
+    return [result async for result in iter_confluence_search(client, api_base, headers, cql, limit, **kwargs)]
+
+
+async def fetch_missing_bodies(client, api_base, headers, results, max_workers=DEFAULT_FETCH_CONCURRENCY, batch_size=SEARCH_PAGE_SIZE):
+    """
+    Fetches body.view and version for any search results that came back without them.
+    Missing pages are requested in `id in (...)` CQL batches that run concurrently, at most
+    `max_workers` at a time, so a cold lookup costs one extra round-trip rather than one per page.
+    Results are updated in place.
+    """
+    missing = {str(r["id"]): r for r in results if r.get("id") and not r.get("body", {}).get("view", {}).get("value")}
+    if not missing:
+        return results
+
+    slots = asyncio.Semaphore(max(1, max_workers))
+    missing_ids = list(missing)
+
+    async def _fetch(batch):
+        async with slots:
+            fetched = await collect_confluence_search(client, api_base, headers, f"id in ({','.join(batch)})", len(batch))
+        for full_content_data in fetched:
+            result_meta = missing.get(str(full_content_data.get("id")))
+            if result_meta is None:
+                continue
+            for key in ("body", "version", "_links"):
+                if key in full_content_data:
+                    result_meta[key] = full_content_data[key]
+
+    batches = [missing_ids[start:start + batch_size] for start in range(0, len(missing_ids), batch_size)]
+    logger.debug("Fetching %d missing page bodies in %d batches with up to %d workers.", len(missing_ids), len(batches), max_workers)
+    # gather() re-raises the first fetch error, matching the old sequential behaviour.
+    await asyncio.gather(*(_fetch(batch) for batch in batches))
+    return results
@@ -0,0 +1,439 @@
+import os
+import json
+import math
+import time
+import asyncio
+import argparse
+import threading
+from collections import Counter
+from dotenv import load_dotenv
+from .confluence_client import iter_confluence_search, collect_confluence_search, fetch_missing_bodies, html_to_text, page_url, DEFAULT_FETCH_CONCURRENCY
+from .http_client import get_http_client, confluence_config, run_sync
+from .telemetry import get_logger
+from .passages import tokenize
+load_dotenv()
+
+
+logger = get_logger(__name__)
+
+
+# BM25 tuning constants.
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Seconds a mirrored page is trusted before its version is re-checked against the server.
+DEFAULT_MAX_AGE = 3600
+# Confluence caps CQL `id in (...)` lists; stale checks are batched to this size.
+VERSION_CHECK_BATCH = 50
+# Share of the (non-stopword) query terms a page must contain to count as a local match. Queries
+# no mirrored page covers fall back to a live search, e.g. for unsynced spaces or new pages.
+DEFAULT_MIN_COVERAGE = 0.75
+
+
+class ConfluenceMirror:
+    """
+    On-disk mirror of Confluence pages with a BM25-ranked inverted index.
+
+    Layout under `root_dir`:
+        pages/<id>.json   cleaned page text plus id, title, url, space, version, synced_at
+        index.json        postings (term -> {id: tf}), document lengths and space sync state
+        journal.jsonl     page touches/updates/removals made by searches since the last full save
+
+    Searches only append to the journal; it is replayed on load and folded into index.json by the
+    next `save()`, which the sync job runs.
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.pages_dir = os.path.join(root_dir, "pages")
+        self.index_path = os.path.join(root_dir, "index.json")
+        self.journal_path = os.path.join(root_dir, "journal.jsonl")
+        self._lock = threading.RLock()
+        self.postings = {}
+        self.doc_len = {}
+        self.meta = {}
+        self.spaces = {}
+        os.makedirs(self.pages_dir, exist_ok=True)
+        self._load()
+
+    # --- Persistence ---
+
+    def _load(self):
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.postings = data.get("postings", {})
+            self.doc_len = data.get("doc_len", {})
+            self.meta = data.get("meta", {})
+            self.spaces = data.get("spaces", {})
+            # Indexes written before stopword filtering carry postings no query can reach any more.
+            for term in [term for term in self.postings if not tokenize(term)]:
+                del self.postings[term]
+        self._replay_journal()
+
+    def save(self):
+        """
+        Writes the full index and clears the journal. This rewrites every posting, so it belongs in
+        the sync job rather than on the search path.
+        """
+        with self._lock:
+            data = {"postings": self.postings, "doc_len": self.doc_len, "meta": self.meta, "spaces": self.spaces}
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.index_path)
+            try:
+                os.remove(self.journal_path)
+            except FileNotFoundError:
+                pass
+
+    def _append_journal(self, entries):
+        if not entries:
+            return
+        with self._lock:
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(entry) + "\n" for entry in entries)
+
+    def _replay_journal(self):
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn last line from an interrupted append; everything before it still applies.
+                continue
+            content_id = entry["id"]
+            if entry["op"] == "touch":
+                if content_id in self.meta:
+                    self.meta[content_id]["synced_at"] = entry["synced_at"]
+                continue
+            # The page file already holds the new text, so old postings are found by scanning.
+            self._drop_postings(content_id)
+            self.doc_len.pop(content_id, None)
+            self.meta.pop(content_id, None)
+            if entry["op"] == "upsert":
+                record = self.get_page(content_id)
+                if record is not None:
+                    self._index_record(record)
+        logger.debug("Replayed %d mirror journal entries.", len(lines))
+
+    def _page_path(self, content_id):
+        return os.path.join(self.pages_dir, f"{content_id}.json")
+
+    def get_page(self, content_id):
+        try:
+            with open(self._page_path(content_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    # --- Index maintenance ---
+
+    def upsert_page(self, content_id, title, url, space_key, version, text):
+        """
+        Stores the cleaned text of a page and (re)indexes it. The title is indexed along with the body.
+        """
+        content_id = str(content_id)
+        with self._lock:
+            self._unindex(content_id)
+            record = {
+                "id": content_id,
+                "title": title,
+                "url": url,
+                "space": space_key,
+                "version": version,
+                "synced_at": time.time(),
+                "text": text,
+            }
+            with open(self._page_path(content_id), "w", encoding="utf-8") as f:
+                json.dump(record, f)
+            self._index_record(record)
+
+    def _index_record(self, record):
+        content_id = record["id"]
+        term_freqs = Counter(tokenize(f"{record['title']}\n{record['text']}"))
+        for term, tf in term_freqs.items():
+            self.postings.setdefault(term, {})[content_id] = tf
+        self.doc_len[content_id] = sum(term_freqs.values())
+        self.meta[content_id] = {key: record[key] for key in ("title", "url", "space", "version", "synced_at")}
+
+    def touch_page(self, content_id):
+        """
+        Marks a page as verified current without re-indexing it. Returns the new synced_at, or None for unknown pages.
+        """
+        with self._lock:
+            if content_id in self.meta:
+                self.meta[content_id]["synced_at"] = time.time()
+                return self.meta[content_id]["synced_at"]
+        return None
+
+    def remove_page(self, content_id):
+        with self._lock:
+            self._unindex(content_id)
+            self.meta.pop(content_id, None)
+            try:
+                os.remove(self._page_path(content_id))
+            except FileNotFoundError:
+                pass
+
+    def _unindex(self, content_id):
+        if content_id not in self.doc_len:
+            return
+        old_page = self.get_page(content_id)
+        if old_page:
+            for term in set(tokenize(f"{old_page.get('title', '')}\n{old_page.get('text', '')}")):
+                docs = self.postings.get(term)
+                if docs is not None:
+                    docs.pop(content_id, None)
+                    if not docs:
+                        del self.postings[term]
+        del self.doc_len[content_id]
+
+    def _drop_postings(self, content_id):
+        for term in [term for term, docs in self.postings.items() if content_id in docs]:
+            docs = self.postings[term]
+            del docs[content_id]
+            if not docs:
+                del self.postings[term]
+
+    # --- Querying ---
+
+    def search(self, query, limit=3, min_coverage=DEFAULT_MIN_COVERAGE):
+        """
+        Returns up to `limit` (content_id, score) pairs ranked by BM25. Stopwords are ignored and
+        only pages containing at least `min_coverage` of the remaining query terms are returned.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            n_docs = len(self.doc_len)
+            if not n_docs:
+                return []
+            avg_len = sum(self.doc_len.values()) / n_docs
+            scores = {}
+            matched = Counter()
+            for term in terms:
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                for content_id, tf in docs.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[content_id] / avg_len)
+                    scores[content_id] = scores.get(content_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+                    matched[content_id] += 1
+        needed = math.ceil(min_coverage * len(terms))
+        hits = [(content_id, score) for content_id, score in scores.items() if matched[content_id] >= needed]
+        return sorted(hits, key=lambda item: item[1], reverse=True)[:limit]
+
+    def stale_ids(self, content_ids, max_age=DEFAULT_MAX_AGE):
+        now = time.time()
+        return [cid for cid in content_ids if now - self.meta.get(cid, {}).get("synced_at", 0) > max_age]
+
+    # --- Server interaction ---
+
+    async def sync_space(self, client, api_base, headers, space_key, max_workers=DEFAULT_FETCH_CONCURRENCY):
+        """
+        Incrementally mirrors one space: lists every page with its version only, downloads bodies
+        just for pages that are new or whose version changed, and drops pages that disappeared.
+        Returns counts of added/updated/unchanged/removed pages.
+        """
+        listed = await collect_confluence_search(client, api_base, headers, f'space = "{space_key}" and type = page', limit=10**9, expand="version")
+        logger.debug("Mirror sync listed %d pages in space %s.", len(listed), space_key)
+
+        changed = []
+        unchanged = 0
+        seen_ids = set()
+        for result_meta in listed:
+            content_id = str(result_meta.get("id"))
+            seen_ids.add(content_id)
+            version = result_meta.get("version", {}).get("number")
+            if content_id in self.meta and self.meta[content_id].get("version") == version:
+                unchanged += 1
+                self.touch_page(content_id)
+            else:
+                changed.append(result_meta)
+
+        added = sum(1 for r in changed if str(r.get("id")) not in self.meta)
+        await self._ingest(client, api_base, headers, changed, space_key, max_workers)
+
+        removed = [cid for cid, m in list(self.meta.items()) if m.get("space") == space_key and cid not in seen_ids]
+        for content_id in removed:
+            self.remove_page(content_id)
+
+        self.spaces[space_key] = {"synced_at": time.time(), "pages": len(seen_ids)}
+        self.save()
+        stats = {"added": added, "updated": len(changed) - added, "unchanged": unchanged, "removed": len(removed)}
+        logger.info("Mirror sync of space %s finished: %s", space_key, stats)
+        return stats
+
+    async def refresh_stale(self, client, api_base, headers, content_ids, max_workers=DEFAULT_FETCH_CONCURRENCY):
+        """
+        Checks the server version of `content_ids` in batched CQL queries and re-downloads
+        only the pages whose version moved. Pages no longer returned by the server are dropped.
+        Mirror files are read and written on worker threads, since this runs inside a search.
+        """
+        if not content_ids:
+            return
+        current = {}
+        for start in range(0, len(content_ids), VERSION_CHECK_BATCH):
+            batch = content_ids[start:start + VERSION_CHECK_BATCH]
+            cql = f"id in ({','.join(batch)})"
+            async for result_meta in iter_confluence_search(client, api_base, headers, cql, limit=len(batch), expand="version"):
+                current[str(result_meta.get("id"))] = result_meta
+
+        changed, journal = await asyncio.to_thread(self._apply_version_check, content_ids, current)
+        logger.debug("Mirror stale check: %d checked, %d changed.", len(content_ids), len(changed))
+        await self._ingest(client, api_base, headers, changed, None, max_workers)
+        journal.extend({"op": "upsert", "id": str(result_meta["id"])} for result_meta in changed)
+        await asyncio.to_thread(self._append_journal, journal)
+
+    def _apply_version_check(self, content_ids, current):
+        """
+        Drops pages missing from `current` and touches unchanged ones. Returns (changed page metadata, journal entries).
+        """
+        changed = []
+        journal = []
+        for content_id in content_ids:
+            result_meta = current.get(content_id)
+            if result_meta is None:
+                self.remove_page(content_id)
+                journal.append({"op": "remove", "id": content_id})
+            elif result_meta.get("version", {}).get("number") != self.meta[content_id].get("version"):
+                changed.append(result_meta)
+            else:
+                synced_at = self.touch_page(content_id)
+                if synced_at is not None:
+                    journal.append({"op": "touch", "id": content_id, "synced_at": synced_at})
+        for result_meta in changed:
+            result_meta.setdefault("space", {"key": self.meta[str(result_meta["id"])].get("space")})
+        return changed, journal
+
+    async def _ingest(self, client, api_base, headers, results, space_key, max_workers):
+        if not results:
+            return
+        await fetch_missing_bodies(client, api_base, headers, results, max_workers=max_workers)
+        for full_content_data in results:
+            await asyncio.to_thread(self._store_fetched, api_base, full_content_data, space_key)
+
+    def _store_fetched(self, api_base, full_content_data, space_key):
+        raw_html_content = full_content_data.get("body", {}).get("view", {}).get("value", "")
+        self.upsert_page(
+            full_content_data.get("id"),
+            full_content_data.get("title", "No Title (from meta)"),
+            page_url(api_base, full_content_data),
+            space_key or full_content_data.get("space", {}).get("key"),
+            full_content_data.get("version", {}).get("number"),
+            html_to_text(raw_html_content),
+        )
+
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+
+def get_mirror():
+    """
+    Returns the process-wide mirror at CONFLUENCE_MIRROR_DIR, or None when mirroring is not configured.
+    """
+    global _mirror
+    mirror_dir = os.getenv("CONFLUENCE_MIRROR_DIR")
+    if not mirror_dir:
+        return None
+    with _mirror_lock:
+        if _mirror is None or _mirror.root_dir != mirror_dir:
+            _mirror = ConfluenceMirror(mirror_dir)
+        return _mirror
+
+
+# --- Command line: sync job and fixture benchmark ---
+
+_BENCH_VOCAB = (
+    "kubernetes cluster deploy runbook incident oncall helm chart ingress certificate cert-manager "
+    "postgres backup restore migration terraform module vpc subnet gateway latency alert dashboard "
+    "grafana prometheus release version upgrade rollback pipeline jenkins artifact registry docker "
+    "image secret vault rotation policy access review onboarding laptop vpn sso okta billing invoice "
+    "quota budget capacity forecast storage bucket retention compliance audit gdpr retention kafka "
+    "topic consumer lag redis cache eviction nginx timeout retry circuit breaker"
+).split()
+
+
+def build_fixture_corpus(mirror, n_pages, seed=7):
+    """
+    Fills `mirror` with `n_pages` synthetic pages drawn from a fixed vocabulary.
+    """
+    import random
+    rng = random.Random(seed)
+    for i in range(n_pages):
+        words = rng.choices(_BENCH_VOCAB, k=rng.randint(150, 900))
+        title = " ".join(rng.sample(_BENCH_VOCAB, 3)).title()
+        html = "".join(f"<p>{' '.join(words[j:j + 30])}</p>" for j in range(0, len(words), 30))
+        mirror.upsert_page(str(100000 + i), title, f"https://example.atlassian.net/wiki/pages/{100000 + i}", "BENCH", 1, html_to_text(html))
+    mirror.save()
+
+
+def run_benchmark(n_pages=3000, n_queries=200):
+    import tempfile
+    import statistics
+    import random
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        mirror = ConfluenceMirror(tmp_dir)
+        started = time.perf_counter()
+        build_fixture_corpus(mirror, n_pages)
+        build_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        reloaded = ConfluenceMirror(mirror.root_dir)
+        load_seconds = time.perf_counter() - started
+
+        rng = random.Random(11)
+        timings = []
+        for _ in range(n_queries):
+            query = " ".join(rng.sample(_BENCH_VOCAB, rng.randint(1, 3)))
+            started = time.perf_counter()
+            reloaded.search(query, limit=3)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        print(f"Fixture corpus: {len(reloaded)} pages, {len(reloaded.postings)} terms")
+        print(f"Build+index: {build_seconds:.2f}s   Load from disk: {load_seconds:.3f}s")
+        print(f"Query latency over {n_queries} queries: p50={statistics.median(timings):.2f}ms "
+              f"p95={timings[int(len(timings) * 0.95) - 1]:.2f}ms max={timings[-1]:.2f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the local Confluence mirror used by internal_confluence_search.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sync_parser = sub.add_parser("sync", help="Incrementally sync one or more spaces into CONFLUENCE_MIRROR_DIR.")
+    sync_parser.add_argument("spaces", nargs="+", help="Space keys to mirror, e.g. ENG PROD")
+    bench_parser = sub.add_parser("bench", help="Index a synthetic fixture corpus and time BM25 queries.")
+    bench_parser.add_argument("--pages", type=int, default=3000)
+    bench_parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        run_benchmark(args.pages, args.queries)
+        return
+
+    api_base, headers = confluence_config()
+    mirror = get_mirror()
+    if not api_base:
+        parser.error("Confluence credentials are not configured in environment variables.")
+    if mirror is None:
+        parser.error("CONFLUENCE_MIRROR_DIR is not set.")
+
+    async def _sync_all():
+        for space_key in args.spaces:
+            stats = await mirror.sync_space(get_http_client(), api_base, headers, space_key)
+            print(f"{space_key}: {stats}")
+
+    run_sync(_sync_all())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import os
+import json
+import asyncio
+import hashlib
+import httpx
+from dotenv import load_dotenv
+from .confluence_client import collect_confluence_search
+from .http_client import get_http_client, confluence_config, run_sync
+from .telemetry import get_logger, traced_tool
+from .resilience import with_deadline
+load_dotenv()
+
+
+logger = get_logger(__name__)
+
+# Write limits for one batch; overridable through the environment. 429 Retry-After is handled by the HTTP layer.
+DEFAULT_PUBLISH_CONCURRENCY = 4
+DEFAULT_PUBLISH_RATE = 5.0
+# Titles looked up per CQL `title in (...)` query.
+TITLE_LOOKUP_BATCH = 25
+# Content property holding the hash of the storage value last written by publish_pages. Confluence
+# normalizes the storage body on save, so the body read back cannot be compared with what was sent.
+CONTENT_HASH_PROPERTY = "agent-content-hash"
+
+
+def storage_body(content):
+    """
+    Wraps tool-provided content in the storage-format paragraph used for every page the agent writes.
+    """
+    return f"<p>{content}</p>"
+
+
+def content_hash(storage_value):
+    return hashlib.sha256(storage_value.strip().encode("utf-8")).hexdigest()
+
+
+def _stored_hash_property(content_data):
+    return content_data.get("metadata", {}).get("properties", {}).get(CONTENT_HASH_PROPERTY)
+
+
+def _hash_property_value(digest):
+    return {"sha256": digest}
+
+
+def _cql_string(value):
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _error_message(e):
+    try:
+        return e.response.json().get("message", "") or str(e)
+    except (AttributeError, json.JSONDecodeError):
+        return str(e)
+
+
+class _RateLimiter:
+    """
+    Spaces calls at least 1/rate seconds apart across all workers of a batch.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def find_existing_pages(client, api_base, headers, space_key, titles):
+    """
+    Returns {casefolded title: content} for pages in `space_key` with any of `titles`, with their
+    version and content-hash property, using batched `title in (...)` CQL queries.
+    """
+    found = {}
+    titles = list(dict.fromkeys(titles))
+    for start in range(0, len(titles), TITLE_LOOKUP_BATCH):
+        batch = titles[start:start + TITLE_LOOKUP_BATCH]
+        cql = f"space = {_cql_string(space_key)} and type = page and title in ({','.join(_cql_string(t) for t in batch)})"
+        expand = f"version,metadata.properties.{CONTENT_HASH_PROPERTY}"
+        for content_data in await collect_confluence_search(client, api_base, headers, cql, limit=len(batch) * 2, expand=expand):
+            found.setdefault(content_data.get("title", "").casefold(), content_data)
+    return found
+
+
+def _page_payload(item, storage_value, version=None, page_id=None):
+    payload = {
+        "type": "page",
+        "title": item["title"],
+        "space": {"key": item["space_key"]},
+        "body": {"storage": {"value": storage_value, "representation": "storage"}},
+    }
+    if item.get("parent_id"):
+        payload["ancestors"] = [{"id": str(item["parent_id"])}]
+    if page_id is not None:
+        payload["id"] = page_id
+        payload["version"] = {"number": version}
+    else:
+        # New pages get their content hash in the same request; updates write it afterwards (see _store_hash).
+        payload["metadata"] = {"properties": {CONTENT_HASH_PROPERTY: {
+            "key": CONTENT_HASH_PROPERTY, "value": _hash_property_value(content_hash(storage_value)),
+        }}}
+    return payload
+
+
+async def _store_hash(client, api_base, headers, page_id, digest, existing_property=None):
+    """
+    Records `digest` in the page's content-hash property, creating the property or writing its next version.
+    """
+    data = {"key": CONTENT_HASH_PROPERTY, "value": _hash_property_value(digest)}
+    if existing_property is None:
+        response = await client.post(f"{api_base}/content/{page_id}/property", headers=headers, json=data)
+    else:
+        data["version"] = {"number": existing_property.get("version", {}).get("number", 1) + 1}
+        response = await client.request("PUT", f"{api_base}/content/{page_id}/property/{CONTENT_HASH_PROPERTY}",
+                                        headers=headers, json=data)
+    response.raise_for_status()
+
+
+async def publish_pages(client, api_base, headers, items, concurrency=DEFAULT_PUBLISH_CONCURRENCY, rate=DEFAULT_PUBLISH_RATE):
+    """
+    Publishes `items` ({space_key, title, content, parent_id?, update_if_exists?}) and returns one
+    result per item, in order, with a 'status' of:
+
+    - created: no page with the title existed, so one was created;
+    - unchanged: a page with the same title and identical content already exists (nothing written);
+    - updated: the page existed with different content and update_if_exists was set, so a new version was written;
+    - exists: the page exists with different content and update_if_exists was not set;
+    - duplicate: an earlier item in the batch has the same space and title;
+    - error: this item failed; the other items are unaffected.
+
+    Existing pages are looked up by title before writing, so repeating a batch does not create duplicates.
+    Content is compared through the hash stored in the page's CONTENT_HASH_PROPERTY when it was last
+    published here; pages without one (e.g. written by hand) count as different.
+    """
+    site_base = f"{api_base.split('/wiki')[0]}/wiki"
+    results = [None] * len(items)
+    first_by_key = {}
+    pending = []
+    for index, item in enumerate(items):
+        result = {"index": index, "space_key": item.get("space_key"), "title": item.get("title")}
+        results[index] = result
+        if not item.get("space_key") or not item.get("title"):
+            result.update(status="error", error="Each page needs a 'space_key' and a 'title'.")
+            continue
+        key = (item["space_key"], item["title"].casefold())
+        if key in first_by_key:
+            result.update(status="duplicate", error=f"Same space and title as item {first_by_key[key]}.")
+            continue
+        first_by_key[key] = index
+        pending.append(index)
+
+    existing = {}
+    for space_key in {items[i]["space_key"] for i in pending}:
+        titles = [items[i]["title"] for i in pending if items[i]["space_key"] == space_key]
+        try:
+            for title_key, content_data in (await find_existing_pages(client, api_base, headers, space_key, titles)).items():
+                existing[(space_key, title_key)] = content_data
+        except httpx.HTTPError as e:
+            logger.warning("Existing-page lookup failed for space %s: %s", space_key, e)
+            for i in pending:
+                if items[i]["space_key"] == space_key:
+                    results[i].update(status="error", error=f"Could not check for existing pages: {_error_message(e)}")
+
+    slots = asyncio.Semaphore(max(1, concurrency))
+    limiter = _RateLimiter(rate)
+
+    def _record(result, status, response_data):
+        result.update(
+            status=status,
+            id=response_data.get("id"),
+            version=response_data.get("version", {}).get("number"),
+            url=site_base + response_data.get("_links", {}).get("webui", ""),
+        )
+
+    async def _publish(index):
+        item, result = items[index], results[index]
+        storage_value = storage_body(item.get("content", ""))
+        digest = content_hash(storage_value)
+        current = existing.get((item["space_key"], item["title"].casefold()))
+        try:
+            if current is not None:
+                stored = _stored_hash_property(current)
+                if stored is not None and stored.get("value", {}).get("sha256") == digest:
+                    _record(result, "unchanged", current)
+                    return
+                if not item.get("update_if_exists"):
+                    _record(result, "exists", current)
+                    return
+                payload = _page_payload(item, storage_value, current.get("version", {}).get("number", 0) + 1, current["id"])
+                async with slots:
+                    await limiter.wait()
+                    response = await client.request("PUT", f"{api_base}/content/{current['id']}", headers=headers, json=payload)
+                response.raise_for_status()
+                _record(result, "updated", response.json())
+                try:
+                    async with slots:
+                        await limiter.wait()
+                        await _store_hash(client, api_base, headers, current["id"], digest, stored)
+                except httpx.HTTPError as e:
+                    # The page itself was written; a missing hash only means the next run rewrites it.
+                    logger.warning("Recording the content hash of '%s' failed: %s", item["title"], e)
+                return
+
+            async with slots:
+                await limiter.wait()
+                response = await client.post(f"{api_base}/content", headers=headers, json=_page_payload(item, storage_value))
+            if response.status_code == 400 and "already exists" in response.text:
+                # Created concurrently since the lookup (e.g. by a retried turn); report it rather than fail.
+                result.update(status="exists", error="A page with this title was created since the lookup.")
+                return
+            response.raise_for_status()
+            _record(result, "created", response.json())
+        except httpx.HTTPError as e:
+            logger.warning("Publishing '%s' to %s failed: %s", item["title"], item["space_key"], e)
+            result.update(status="error", error=_error_message(e))
+
+    await asyncio.gather(*(_publish(i) for i in pending if "status" not in results[i]))
+    return results
+
+
+@traced_tool
+@with_deadline
+async def create_confluence_pages_async(pages: list[dict], parent_id: str = "", update_if_exists: bool = False):
+    """
+    Use this tool to publish several Confluence pages in one step.
+    Provide 'pages' as a list of objects with 'space_key', 'title' and 'content' (standard HTML,
+    storage format), and optionally a per-page 'parent_id' and 'update_if_exists'. 'parent_id' and
+    'update_if_exists' given to the tool apply to every page that does not set its own.
+    Pages that already exist with the same content are not created again. Each page gets its own
+    result with a 'status' (created, updated, unchanged, exists, duplicate or error) and its 'url'.
+    """
+    CONFLUENCE_API_BASE, headers = confluence_config()
+    if not CONFLUENCE_API_BASE:
+        return {"error": "Confluence credentials are not configured in environment variables."}
+    if not pages:
+        return {"error": "No pages were provided to publish."}
+
+    items = [
+        {**page, "parent_id": page.get("parent_id") or parent_id, "update_if_exists": page.get("update_if_exists", update_if_exists)}
+        for page in pages
+    ]
+    results = await publish_pages(
+        get_http_client(), CONFLUENCE_API_BASE, headers, items,
+        concurrency=int(os.getenv("CONFLUENCE_PUBLISH_CONCURRENCY", DEFAULT_PUBLISH_CONCURRENCY)),
+        rate=float(os.getenv("CONFLUENCE_PUBLISH_RATE", DEFAULT_PUBLISH_RATE)),
+    )
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    logger.debug("Published %d pages: %s", len(results), counts)
+    return {"results": results, "counts": counts}
+
+
+def create_confluence_pages(pages: list[dict], parent_id: str = "", update_if_exists: bool = False):
+    """
+    Use this tool to publish several Confluence pages in one step.
+    Provide 'pages' as a list of objects with 'space_key', 'title' and 'content' (standard HTML,
+    storage format), and optionally a per-page 'parent_id' and 'update_if_exists'. 'parent_id' and
+    'update_if_exists' given to the tool apply to every page that does not set its own.
+    Pages that already exist with the same content are not created again. Each page gets its own
+    result with a 'status' (created, updated, unchanged, exists, duplicate or error) and its 'url'.
+    """
+    return run_sync(create_confluence_pages_async(pages, parent_id, update_if_exists))
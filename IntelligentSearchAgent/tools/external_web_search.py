@@ -1,10 +1,44 @@
 import os
-from tavily import TavilyClient
 from dotenv import load_dotenv
+from .http_client import get_tavily_client, run_sync
+from .search_cache import get_search_cache, normalize_query
+from .telemetry import get_logger, span, traced_tool
+from .resilience import with_deadline
 load_dotenv()
 
 
-def external_web_search(query: str, search_depth: str = "basic"):
+logger = get_logger(__name__)
+
+
+MAX_RESULTS = 5
+NO_RESULTS_RESPONSE = "No reliable source found for that information."
+
+
+async def tavily_search_results(api_key, query, search_depth="basic", max_results=MAX_RESULTS):
+    """
+    Returns Tavily's raw result list for `query`, served from the shared result cache when possible.
+    The cache key is the normalized query plus search_depth and max_results.
+    """
+    async def _fetch():
+        with span("tavily_search", kind="http", search_depth=search_depth):
+            results_json = await get_tavily_client(api_key).search(
+                query=query.strip(),
+                search_depth=search_depth,
+                max_results=max_results,
+                include_answer=False,
+                include_raw_content=False,
+            )
+        return results_json.get("results", [])
+
+    search_cache = get_search_cache()
+    if search_cache is None:
+        return await _fetch()
+    return await search_cache.get_or_fetch((normalize_query(query), search_depth, max_results), _fetch)
+
+
+@traced_tool
+@with_deadline
+async def external_web_search_async(query: str, search_depth: str = "basic"):
     """
     Searches the external web using the Tavily API to find relevant pages.
     Takes a `query` string and returns a list of dictionaries, each with
@@ -17,19 +51,9 @@ def external_web_search(query: str, search_depth: str = "basic"):
 
 
     try:
-        tavily_client = TavilyClient(api_key=TAVILY_API_KEY)
-        results_json = tavily_client.search(
-            query=query.strip(),
-            search_depth=search_depth,
-            max_results=5,
-            include_answer=False,
-            include_raw_content=False,
-        )
-
-
-        results = results_json.get("results", [])
+        results = await tavily_search_results(TAVILY_API_KEY, query, search_depth)
         if not results:
-            return {"response": "No reliable source found for that information."}
+            return {"response": NO_RESULTS_RESPONSE}
 
 
         links_md = ""
@@ -44,6 +68,15 @@ def external_web_search(query: str, search_depth: str = "basic"):
 
 
     except Exception as e:
-        return {"response": f"External web search failed: {e}"}
+        logger.warning("External web search failed: %s", e)
+        return {"error": f"External web search failed: {e}"}
 
 
+def external_web_search(query: str, search_depth: str = "basic"):
+    """
+    Searches the external web using the Tavily API to find relevant pages.
+    Takes a `query` string and returns a list of dictionaries, each with
+    'title', 'link', and 'snippet' for relevant web pages.
+    Use `search_depth='advanced'` for more comprehensive results when needed.
+    """
+    return run_sync(external_web_search_async(query, search_depth))
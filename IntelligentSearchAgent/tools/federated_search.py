@@ -0,0 +1,107 @@
+import os
+import time
+import asyncio
+from dotenv import load_dotenv
+from .http_client import run_sync
+from .internal_confluence_search import internal_confluence_search_async
+from .external_web_search import external_web_search_async, NO_RESULTS_RESPONSE
+from .telemetry import get_logger, traced_tool
+from .resilience import with_deadline
+load_dotenv()
+
+
+logger = get_logger(__name__)
+
+
+# Per-backend deadlines in seconds, measured from the start of the federated call.
+DEFAULT_CONFLUENCE_DEADLINE = 10.0
+DEFAULT_WEB_DEADLINE = 15.0
+
+
+async def _timed(coro):
+    started = time.perf_counter()
+    result = await coro
+    return result, round((time.perf_counter() - started) * 1000)
+
+
+@traced_tool
+@with_deadline
+async def federated_search_async(query: str, search_depth: str = "basic"):
+    """
+    Searches internal Confluence and the external web (Tavily) at the same time.
+    Confluence keeps precedence: when it returns pages, the result has 'answered_by' set to
+    'confluence' and the pages under 'results', and the web search is cancelled. Otherwise
+    'answered_by' is 'web' and 'response' holds the external web search sources. When neither
+    found anything 'answered_by' is None, with an 'error' if a backend failed.
+    'timings_ms' reports how long each backend took.
+    """
+    confluence_deadline = float(os.getenv("FEDERATED_CONFLUENCE_DEADLINE", DEFAULT_CONFLUENCE_DEADLINE))
+    web_deadline = float(os.getenv("FEDERATED_WEB_DEADLINE", DEFAULT_WEB_DEADLINE))
+    started = time.perf_counter()
+
+    confluence_task = asyncio.create_task(_timed(internal_confluence_search_async(query)))
+    web_task = asyncio.create_task(_timed(external_web_search_async(query, search_depth)))
+    try:
+        return await _combine(confluence_task, web_task, confluence_deadline, web_deadline, started)
+    finally:
+        # Also reached when the caller is cancelled (e.g. its deadline expired); no backend call may outlive it.
+        for task in (confluence_task, web_task):
+            if not task.done():
+                task.cancel()
+
+
+async def _combine(confluence_task, web_task, confluence_deadline, web_deadline, started):
+    timings = {}
+    try:
+        confluence_result, timings["confluence"] = await asyncio.wait_for(confluence_task, timeout=confluence_deadline)
+    except asyncio.TimeoutError:
+        confluence_result = {"error": f"Confluence did not answer within {confluence_deadline:g} seconds."}
+        timings["confluence"] = round(confluence_deadline * 1000)
+
+    if confluence_result.get("results"):
+        if not web_task.done():
+            web_task.cancel()
+            timings["web"] = "cancelled"
+        else:
+            timings["web"] = web_task.result()[1]
+        logger.debug("Federated search answered by Confluence; timings: %s", timings)
+        return {"answered_by": "confluence", "results": confluence_result["results"], "timings_ms": timings}
+
+    confluence_status = confluence_result.get("error") or confluence_result.get("response")
+    remaining = max(0.0, web_deadline - (time.perf_counter() - started))
+    try:
+        web_result, timings["web"] = await asyncio.wait_for(web_task, timeout=remaining)
+    except asyncio.TimeoutError:
+        timings["web"] = round(web_deadline * 1000)
+        logger.debug("Federated search found nothing in time; timings: %s", timings)
+        return {
+            "answered_by": None,
+            "error": f"Confluence: {confluence_status} External web search did not answer within {web_deadline:g} seconds.",
+            "timings_ms": timings,
+        }
+
+    if "error" in web_result:
+        logger.debug("Federated search failed on both backends; timings: %s", timings)
+        return {"answered_by": None, "error": f"Confluence: {confluence_status} Web: {web_result['error']}", "timings_ms": timings}
+    if web_result.get("response") == NO_RESULTS_RESPONSE:
+        logger.debug("Federated search found no sources; timings: %s", timings)
+        return {"answered_by": None, "response": NO_RESULTS_RESPONSE, "confluence_status": confluence_status, "timings_ms": timings}
+    logger.debug("Federated search answered by the web; timings: %s", timings)
+    return {
+        "answered_by": "web",
+        "response": web_result.get("response"),
+        "confluence_status": confluence_status,
+        "timings_ms": timings,
+    }
+
+
+def federated_search(query: str, search_depth: str = "basic"):
+    """
+    Searches internal Confluence and the external web (Tavily) at the same time.
+    Confluence keeps precedence: when it returns pages, the result has 'answered_by' set to
+    'confluence' and the pages under 'results', and the web search is cancelled. Otherwise
+    'answered_by' is 'web' and 'response' holds the external web search sources. When neither
+    found anything 'answered_by' is None, with an 'error' if a backend failed.
+    'timings_ms' reports how long each backend took.
+    """
+    return run_sync(federated_search_async(query, search_depth))
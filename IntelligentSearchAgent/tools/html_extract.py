@@ -0,0 +1,307 @@
+import os
+import time
+import codecs
+import argparse
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+
+# Hard ceiling on bytes read from a response body in streaming mode.
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+# Bytes read past the point where the character budget first filled, in case a preferred region
+# (e.g. <main> after a full <article>, or any region on a page without one yet) still follows.
+DEFAULT_LOOKAHEAD_BYTES = 256 * 1024
+
+# Same page chrome the full BeautifulSoup path decomposes; void tags (img, link, meta) carry no text.
+SKIP_TAGS = {"script", "style", "header", "footer", "nav", "aside", "form", "noscript"}
+
+
+def _region_priority(tag, attrs):
+    """
+    Priority of a main-content candidate, mirroring extract_main_text's lookup order
+    (main, article, div.content, div[role=main]); None when the tag is not a candidate.
+    """
+    if tag == "main":
+        return 0
+    if tag == "article":
+        return 1
+    if tag == "div":
+        if "content" in (attrs.get("class") or "").split():
+            return 2
+        if attrs.get("role") == "main":
+            return 3
+    return None
+
+
+class MainTextCollector:
+    """
+    Parser target that collects visible text for the whole page and for the first occurrence of each
+    main-content candidate region. `done` is set once a <main> region holds `max_chars`, since no
+    other region can take precedence over it; `budget_full` once the page or any region does.
+
+    Works as an lxml parser target (start/end/data/close) and is driven by the stdlib fallback below.
+    """
+
+    def __init__(self, max_chars):
+        self.max_chars = max_chars
+        self.done = False
+        self.budget_full = False
+        self._skip_depth = {}
+        self._page = []
+        self._page_chars = 0
+        # Parsers may split one text node across several data() calls (e.g. at chunk boundaries).
+        self._pending = []
+        self._regions = {}
+        self._region_chars = {}
+        # Open regions as [tag, priority, same-tag nesting depth].
+        self._open = []
+
+    def _skipping(self):
+        return any(self._skip_depth.values())
+
+    def start(self, tag, attrs):
+        self._flush()
+        tag = tag.lower()
+        for region in self._open:
+            if region[0] == tag:
+                region[2] += 1
+        if tag in SKIP_TAGS:
+            self._skip_depth[tag] = self._skip_depth.get(tag, 0) + 1
+            return
+        priority = _region_priority(tag, dict(attrs))
+        if priority is not None and priority not in self._regions and not self._skipping():
+            self._regions[priority] = []
+            self._region_chars[priority] = 0
+            self._open.append([tag, priority, 1])
+
+    def end(self, tag):
+        self._flush()
+        tag = tag.lower()
+        if self._skip_depth.get(tag):
+            self._skip_depth[tag] -= 1
+        for region in list(self._open):
+            if region[0] == tag:
+                region[2] -= 1
+                if region[2] == 0:
+                    self._open.remove(region)
+
+    def data(self, text):
+        if not self.done and not self._skipping():
+            self._pending.append(text)
+
+    def _flush(self):
+        if not self._pending:
+            return
+        text = "".join(self._pending).strip()
+        self._pending = []
+        if not text:
+            return
+        if self._page_chars < self.max_chars:
+            self._page.append(text)
+            self._page_chars += len(text) + 1
+        for _, priority, _ in self._open:
+            if self._region_chars[priority] < self.max_chars:
+                self._regions[priority].append(text)
+                self._region_chars[priority] += len(text) + 1
+        if self._page_chars >= self.max_chars or any(chars >= self.max_chars for chars in self._region_chars.values()):
+            self.budget_full = True
+        if self._region_chars.get(0, 0) >= self.max_chars:
+            self.done = True
+
+    def close(self):
+        return self.text()
+
+    def text(self):
+        self._flush()
+        for priority in sorted(self._regions):
+            if self._regions[priority]:
+                return "\n".join(self._regions[priority])
+        return "\n".join(self._page)
+
+
+class _StdlibFeeder(HTMLParser):
+    def __init__(self, collector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs):
+        self.collector.start(tag, [(name, value or "") for name, value in attrs])
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+    def handle_data(self, data):
+        self.collector.data(data)
+
+
+class StreamingExtractor:
+    """
+    Incremental main-text extractor. Feed decoded HTML chunks; check `should_stop()` to stop reading early.
+    Uses lxml's feed parser when lxml is installed, otherwise the stdlib HTMLParser.
+
+    Reading stops when a <main> region fills the budget, or `lookahead_bytes` after the page text or
+    any region first did. Region precedence therefore matches extract_main_text only within that
+    window: a <main> starting further down is not seen, and the region already collected is used.
+    """
+
+    def __init__(self, max_chars, use_lxml=None, lookahead_bytes=DEFAULT_LOOKAHEAD_BYTES):
+        self.collector = MainTextCollector(max_chars)
+        self.lookahead_bytes = lookahead_bytes
+        self._full_at = None
+        self.use_lxml = lxml_etree is not None if use_lxml is None else use_lxml
+        if self.use_lxml:
+            self._parser = lxml_etree.HTMLParser(target=self.collector, recover=True, no_network=True)
+        else:
+            self._parser = _StdlibFeeder(self.collector)
+
+    @property
+    def done(self):
+        return self.collector.done
+
+    def feed(self, chunk):
+        if chunk:
+            self._parser.feed(chunk)
+
+    def should_stop(self, bytes_read):
+        if self.collector.done:
+            return True
+        if self._full_at is None and self.collector.budget_full:
+            self._full_at = bytes_read
+        return self._full_at is not None and bytes_read - self._full_at >= self.lookahead_bytes
+
+    def finish(self):
+        try:
+            self._parser.close()
+        except Exception:
+            # lxml raises on documents it could not recover; whatever was collected is still valid.
+            pass
+        return self.collector.text()
+
+
+def extract_from_chunks(chunks, max_chars, encoding="utf-8", max_bytes=DEFAULT_MAX_BYTES, use_lxml=None):
+    """
+    Extracts main text from an iterable of byte chunks, stopping at `max_bytes` or once the budget is full.
+    Returns (text, bytes_read).
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    extractor = StreamingExtractor(max_chars, use_lxml=use_lxml)
+    bytes_read = 0
+    for chunk in chunks:
+        chunk = chunk[:max_bytes - bytes_read]
+        bytes_read += len(chunk)
+        extractor.feed(decoder.decode(chunk))
+        if extractor.should_stop(bytes_read) or bytes_read >= max_bytes:
+            break
+    extractor.feed(decoder.decode(b"", final=True))
+    return extractor.finish(), bytes_read
+
+
+async def extract_from_stream(response, max_chars, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Async counterpart of extract_from_chunks for a streamed httpx response. Stops reading the
+    body once the ceiling or the character budget (plus the lookahead) is reached. Returns (text, bytes_read).
+    """
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+    extractor = StreamingExtractor(max_chars)
+    bytes_read = 0
+    async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+        chunk = chunk[:max_bytes - bytes_read]
+        bytes_read += len(chunk)
+        extractor.feed(decoder.decode(chunk))
+        if extractor.should_stop(bytes_read) or bytes_read >= max_bytes:
+            break
+    extractor.feed(decoder.decode(b"", final=True))
+    return extractor.finish(), bytes_read
+
+
+# --- Benchmark: full BeautifulSoup path vs streaming extraction ---
+
+def _write_synthetic_corpus(corpus_dir):
+    paragraph = "<p>" + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 6 + "</p>\n"
+    nav = "<nav><ul>" + "".join(f"<li><a href='/n{i}'>Nav {i}</a></li>" for i in range(200)) + "</ul></nav>\n"
+    script = "<script>" + "var x = 1;" * 2000 + "</script>\n"
+    for size_kb in (50, 500, 2048, 8192):
+        path = os.path.join(corpus_dir, f"page_{size_kb}kb.html")
+        parts = ["<html><head><title>t</title>", script, "</head><body>", nav, "<main>"]
+        written = sum(len(p) for p in parts)
+        while written < size_kb * 1024:
+            parts.append(paragraph)
+            written += len(paragraph)
+        parts.append("</main><footer>footer</footer></body></html>")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join(parts))
+
+
+def _file_chunks(path):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def run_benchmark(corpus_dir=None, repeat=3, max_chars=8000):
+    import tempfile
+    import tracemalloc
+    from .scrape_webpage_content import extract_main_text
+
+    tmp_dir = None
+    if corpus_dir is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        corpus_dir = tmp_dir.name
+        _write_synthetic_corpus(corpus_dir)
+
+    def _measure(fn):
+        best = None
+        for _ in range(repeat):
+            tracemalloc.start()
+            started = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            best = (elapsed, peak) if best is None or elapsed < best[0] else best
+        return best
+
+    modes = [("full", None), ("stream-stdlib", False)]
+    if lxml_etree is not None:
+        modes.append(("stream-lxml", True))
+
+    print(f"{'file':<24}{'size':>10}  " + "  ".join(f"{name:>22}" for name, _ in modes))
+    for name in sorted(os.listdir(corpus_dir)):
+        path = os.path.join(corpus_dir, name)
+        if not name.endswith((".html", ".htm")):
+            continue
+        cells = []
+        for mode, use_lxml in modes:
+            if mode == "full":
+                def fn(path=path):
+                    with open(path, "r", encoding="utf-8", errors="replace") as f:
+                        extract_main_text(f.read())[:max_chars]
+            else:
+                def fn(path=path, use_lxml=use_lxml):
+                    extract_from_chunks(_file_chunks(path), max_chars + 1, use_lxml=use_lxml)
+            elapsed, peak = _measure(fn)
+            cells.append(f"{elapsed * 1000:9.1f}ms {peak / 1024 / 1024:7.1f}MiB")
+        print(f"{name:<24}{os.path.getsize(path) / 1024:>8.0f}KB  " + "  ".join(f"{c:>22}" for c in cells))
+
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare full and streaming HTML extraction on a corpus of HTML files.")
+    parser.add_argument("--corpus", help="Directory of .html files (default: generate a synthetic 50KB-8MB corpus)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    run_benchmark(args.corpus, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import os
+import base64
+import asyncio
+import threading
+import weakref
+import functools
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+import httpx
+from tavily import AsyncTavilyClient
+from .telemetry import span, HTTP_RESPONSE_BYTES
+from .resilience import ResilientTransport, IDEMPOTENT_METHODS
+
+
+# Pool sizing for the shared client; overridable through the environment.
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_PER_HOST = 10
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+DEFAULT_TIMEOUT = 30.0
+
+
+class PooledHttpClient:
+    """
+    Keep-alive httpx.AsyncClient shared by all tools on one event loop, with a
+    per-host concurrency cap layered on top of httpx's global connection limit.
+    Requests go through ResilientTransport (deadlines, retries, circuit breakers, hedging).
+    """
+
+    def __init__(self, max_connections=None, max_per_host=None, keepalive_expiry=None, timeout=None):
+        self.max_per_host = max_per_host or int(os.getenv("HTTP_MAX_PER_HOST", DEFAULT_MAX_PER_HOST))
+        limits = httpx.Limits(
+            max_connections=max_connections or int(os.getenv("HTTP_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+            max_keepalive_connections=self.max_per_host * 4,
+            keepalive_expiry=keepalive_expiry or float(os.getenv("HTTP_KEEPALIVE_EXPIRY", DEFAULT_KEEPALIVE_EXPIRY)),
+        )
+        self.client = httpx.AsyncClient(
+            transport=ResilientTransport(httpx.AsyncHTTPTransport(limits=limits)),
+            timeout=timeout or DEFAULT_TIMEOUT,
+            follow_redirects=True,
+        )
+        self._host_slots = {}
+
+    def _slot(self, url):
+        host = urlsplit(str(url)).netloc
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.max_per_host)
+        return slot
+
+    async def request(self, method, url, **kwargs):
+        with span(method, kind="http", host=urlsplit(str(url)).netloc) as http_span:
+            async with self._slot(url):
+                response = await self.client.request(method, url, **kwargs)
+            _record_response(http_span, response)
+            return response
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method, url, **kwargs):
+        with span(method, kind="http", host=urlsplit(str(url)).netloc, streamed=True) as http_span:
+            async with self._slot(url):
+                async with self.client.stream(method, url, **kwargs) as response:
+                    try:
+                        yield response
+                    finally:
+                        _record_response(http_span, response)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def _record_response(http_span, response):
+    # num_bytes_downloaded covers only what was actually read, so early-exit streams count partial bodies.
+    HTTP_RESPONSE_BYTES.inc(response.num_bytes_downloaded, method=response.request.method)
+    http_span.set(status=response.status_code, bytes=response.num_bytes_downloaded)
+    if response.status_code >= 400:
+        http_span.fail(f"HTTP {response.status_code}")
+
+
+# httpx clients are bound to the loop that first used them, so there is one client per running loop.
+_clients = weakref.WeakKeyDictionary()
+_tavily_clients = weakref.WeakKeyDictionary()
+
+
+def get_http_client():
+    """
+    Returns the pooled client for the running event loop, creating it on first use.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = PooledHttpClient()
+    return client
+
+
+def get_tavily_client(api_key):
+    """
+    Returns an AsyncTavilyClient for the running event loop and `api_key`, reusing its connection pool.
+    """
+    loop = asyncio.get_running_loop()
+    clients = _tavily_clients.setdefault(loop, {})
+    client = clients.get(api_key)
+    if client is None:
+        # TAVILY_API_BASE_URL points the client at a stand-in server, e.g. the offline benchmark stub.
+        base_url = os.getenv("TAVILY_API_BASE_URL")
+        options = {"api_base_url": base_url} if base_url else {}
+        # Tavily's search endpoint is a read-only POST, so it is retried like a GET.
+        transport = ResilientTransport(httpx.AsyncHTTPTransport(), idempotent_methods=IDEMPOTENT_METHODS | {"POST"})
+        try:
+            client = AsyncTavilyClient(api_key=api_key, client=httpx.AsyncClient(transport=transport), **options)
+        except TypeError:
+            # tavily-python releases before the `client` argument manage their own httpx client.
+            client = AsyncTavilyClient(api_key=api_key, **options)
+        clients[api_key] = client
+    return client
+
+
+@functools.lru_cache(maxsize=8)
+def basic_auth_headers(email, token):
+    """
+    Confluence Basic auth headers, computed once per credential pair.
+    """
+    auth_header_value = base64.b64encode(f"{email}:{token}".encode("utf-8")).decode("utf-8")
+    return {
+        "Authorization": f"Basic {auth_header_value}",
+        "Content-Type": "application/json"
+    }
+
+
+def confluence_config():
+    """
+    Returns (api_base, headers) for the configured Confluence instance, or (None, None) when credentials are missing.
+    """
+    api_base = os.getenv("CONFLUENCE_API_BASE")
+    token = os.getenv("CONFLUENCE_API_TOKEN")
+    email = os.getenv("CONFLUENCE_USER_EMAIL")
+    if not (api_base and token and email):
+        return None, None
+    return api_base, basic_auth_headers(email, token)
+
+
+# --- Sync bridge ---
+
+_background_loop = None
+_background_lock = threading.Lock()
+
+
+def _get_background_loop():
+    global _background_loop
+    with _background_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, name="tools-http-loop", daemon=True).start()
+        return _background_loop
+
+
+def run_sync(coro):
+    """
+    Runs `coro` on a long-lived background event loop and waits for the result, so sync
+    callers share one warm connection pool and work even when called from inside another loop.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_background_loop()).result()
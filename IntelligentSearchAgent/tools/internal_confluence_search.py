@@ -1,100 +1,149 @@
 from dotenv import load_dotenv
 import os
-import base64
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urlencode
+import asyncio
+import httpx
+from .confluence_client import collect_confluence_search, fetch_missing_bodies, html_to_text, page_url, DEFAULT_FETCH_CONCURRENCY
+from .confluence_mirror import get_mirror, DEFAULT_MAX_AGE
+from .page_cache import get_page_cache
+from .http_client import get_http_client, confluence_config, run_sync
+from .telemetry import get_logger, span, traced_tool, EXTRACTED_CHARS
+from .resilience import with_deadline
+from .passages import select_passages
 
 
-def internal_confluence_search(query: str, limit: int = 3):
+logger = get_logger(__name__)
+
+# Per-result token budget for the passages sent back to the model (about the old 1000-character cut).
+DEFAULT_PASSAGE_TOKENS = 250
+
+
+def _select_content(query, results):
+    """
+    Replaces each result's full text with the passages most relevant to `query`, dropping passages
+    that repeat one from a higher-ranked result.
+    """
+    token_budget = int(os.getenv("CONFLUENCE_PASSAGE_TOKENS", DEFAULT_PASSAGE_TOKENS))
+    selected = select_passages(query, [result["content"] for result in results], token_budget)
+    for result, content in zip(results, selected):
+        result["content"] = content or "(Same content as an earlier result.)"
+    return results
+
+
+async def _search_mirror(mirror, client, api_base, headers, query, limit, fetch_concurrency):
+    """
+    Answers `query` from the local mirror, re-checking only hits older than CONFLUENCE_MIRROR_MAX_AGE.
+    Returns None when the mirror has no match so the caller can fall back to a live search. Page
+    files are read on a worker thread so other tool calls keep running.
+    """
+    hits = mirror.search(query, limit)
+    if not hits:
+        return None
+    max_age = float(os.getenv("CONFLUENCE_MIRROR_MAX_AGE", DEFAULT_MAX_AGE))
+    stale = mirror.stale_ids([content_id for content_id, _ in hits], max_age)
+    if stale:
+        logger.debug("Re-checking %d stale mirrored pages against Confluence.", len(stale))
+        await mirror.refresh_stale(client, api_base, headers, stale, max_workers=fetch_concurrency)
+        hits = mirror.search(query, limit)
+
+    pages = await asyncio.to_thread(lambda: [mirror.get_page(content_id) for content_id, _ in hits])
+    final_results = []
+    for (content_id, _), page in zip(hits, pages):
+        if not page or not page.get("text", "").strip():
+            continue
+        content_text = page["text"]
+        final_results.append({
+            "id": content_id,
+            "title": page.get("title"),
+            "url": page.get("url", ""),
+            "content": content_text,
+            "version": page.get("version")
+        })
+    logger.debug("Served %d results from the local Confluence mirror.", len(final_results))
+    return _select_content(query, final_results) or None
+
+
+@traced_tool
+@with_deadline
+async def internal_confluence_search_async(query: str, limit: int = 3):
     """
     Searches internal Confluence content based on a keyword or phrase,
-    then fetches and extracts the full content for the top results.
+    then fetches the top results and returns the passages of each page that best match the query.
     """
-    CONFLUENCE_API_BASE = os.getenv("CONFLUENCE_API_BASE")
-    CONFLUENCE_API_TOKEN = os.getenv("CONFLUENCE_API_TOKEN")
-    CONFLUENCE_USER_EMAIL = os.getenv("CONFLUENCE_USER_EMAIL")
+    CONFLUENCE_API_BASE, headers = confluence_config()
 
 
-    if not (CONFLUENCE_API_BASE and CONFLUENCE_API_TOKEN and CONFLUENCE_USER_EMAIL):
+    if not CONFLUENCE_API_BASE:
         return {"error": "Confluence credentials are not configured in environment variables."}
-   
-   
-   
-    auth_header_value = base64.b64encode(f"{CONFLUENCE_USER_EMAIL}:{CONFLUENCE_API_TOKEN}".encode("utf-8")).decode("utf-8")
-    headers = {
-        "Authorization": f"Basic {auth_header_value}",
-        "Content-Type": "application/json"
-    }
 
 
-    print(f"DEBUG: Confluence search query: '{query}'")
-    print(f"DEBUG: Using API Base: {CONFLUENCE_API_BASE}")
+    logger.debug("Confluence search query: '%s' against %s", query, CONFLUENCE_API_BASE)
 
 
     try:
-        search_params = {
-            "cql": f'text ~ "{query}"',
-            "limit": limit,
-        }
-        print(f"DEBUG: Confluence search URL: {CONFLUENCE_API_BASE}/content/search?{urlencode(search_params)}")
-
+        # Parsed inside the guard so a malformed value is reported as an error result, not raised.
+        fetch_concurrency = int(os.getenv("CONFLUENCE_FETCH_CONCURRENCY", DEFAULT_FETCH_CONCURRENCY))
+        client = get_http_client()
+        # The first call loads the index and replays the journal from disk.
+        mirror = await asyncio.to_thread(get_mirror)
+        if mirror is not None and len(mirror):
+            mirror_results = await _search_mirror(mirror, client, CONFLUENCE_API_BASE, headers, query, limit, fetch_concurrency)
+            if mirror_results:
+                return {"results": mirror_results}
 
-        search_response = requests.get(f"{CONFLUENCE_API_BASE}/content/search", headers=headers, params=search_params)
-        search_response.raise_for_status()
-        search_data = search_response.json()
-        print(f"DEBUG: Confluence initial search response (raw JSON): {search_data}")
+        page_cache = get_page_cache()
+        # With a page cache the search only asks for versions; bodies are downloaded for cache misses alone.
+        search_expand = "version" if page_cache is not None else "body.view,version"
 
-
-        found_results = search_data.get("results", [])
-        print(f"DEBUG: Number of results from initial search: {len(found_results)}")
+        found_results = await collect_confluence_search(client, CONFLUENCE_API_BASE, headers, f'text ~ "{query}"', limit, expand=search_expand)
+        logger.debug("Number of results from initial search: %d", len(found_results))
 
 
         if not found_results:
-            print("DEBUG: No results found in initial search.")
+            logger.debug("No results found in initial search.")
             return {"response": "No relevant internal Confluence documents found."}
 
 
-        final_results = []
-        for result_meta in found_results:
-            content_id = result_meta.get("id")
-            title = result_meta.get("title", "No Title (from meta)")
-            print(f"DEBUG: Processing result ID: {content_id}, Title: {title}")
-
-
-            if not content_id:
-                print(f"DEBUG: Skipping result due to missing ID: {result_meta}")
-                continue
+        cached_texts = {}
+        if page_cache is not None:
+            for result_meta in found_results:
+                cached_text = page_cache.get(result_meta.get("id"), result_meta.get("version", {}).get("number"))
+                if cached_text is not None:
+                    cached_texts[result_meta["id"]] = cached_text
+            logger.debug("Page cache hits: %d of %d", len(cached_texts), len(found_results))
 
 
-            content_url = f"{CONFLUENCE_API_BASE}/content/{content_id}"
-            content_params = {"expand": "body.view,version"}
-            print(f"DEBUG: Fetching full content from URL: {content_url}?{urlencode(content_params)}")
+        uncached_results = [r for r in found_results if r.get("id") not in cached_texts]
+        await fetch_missing_bodies(client, CONFLUENCE_API_BASE, headers, uncached_results, max_workers=fetch_concurrency)
 
 
-            content_response = requests.get(content_url, headers=headers, params=content_params)
-            content_response.raise_for_status()
-            full_content_data = content_response.json()
-            print(f"DEBUG: Full content response (raw JSON) for ID {content_id}: {full_content_data}")
+        final_results = []
+        for full_content_data in found_results:
+            content_id = full_content_data.get("id")
+            title = full_content_data.get("title", "No Title (from meta)")
+            logger.debug("Processing result ID: %s, Title: %s", content_id, title)
 
 
-            raw_html_content = full_content_data.get("body", {}).get("view", {}).get("value", "")
-            print(f"DEBUG: Raw HTML content length for ID {content_id}: {len(raw_html_content)}")
+            if not content_id:
+                logger.debug("Skipping result without an ID (keys: %s)", sorted(full_content_data))
+                continue
 
 
-            content_text = BeautifulSoup(raw_html_content, "html.parser").get_text(separator="\n", strip=True)
-            print(f"DEBUG: Cleaned text content length for ID {content_id}: {len(content_text)}")
+            version = full_content_data.get("version", {}).get("number")
 
 
-            webui_link = full_content_data.get("_links", {}).get("webui")
-            if webui_link:
-                url = f"{CONFLUENCE_API_BASE.split('/wiki')[0]}/wiki{webui_link}"
+            if content_id in cached_texts:
+                content_text = cached_texts[content_id]
             else:
-                url = ""
-            print(f"DEBUG: Generated URL for ID {content_id}: {url}")
+                raw_html_content = full_content_data.get("body", {}).get("view", {}).get("value", "")
+                with span("confluence_html", kind="extract", bytes=len(raw_html_content)):
+                    content_text = await asyncio.to_thread(html_to_text, raw_html_content)
+                EXTRACTED_CHARS.inc(len(content_text), source="confluence")
+                if page_cache is not None:
+                    page_cache.put(content_id, version, content_text)
+            logger.debug("Cleaned text content length for ID %s: %d", content_id, len(content_text))
 
 
-            version = full_content_data.get("version", {}).get("number")
+            url = page_url(CONFLUENCE_API_BASE, full_content_data)
 
 
             if content_text.strip():
@@ -102,27 +151,35 @@ def internal_confluence_search(query: str, limit: int = 3):
                     "id": content_id,
                     "title": title,
                     "url": url,
-                    "content": content_text[:1000] + "..." if len(content_text) > 1000 else content_text,
+                    "content": content_text,
                     "version": version
                 })
             else:
-                print(f"DEBUG: Skipped result ID {content_id} due to empty or minimal extracted content.")
+                logger.debug("Skipped result ID %s due to empty or minimal extracted content.", content_id)
 
 
         if not final_results:
-            print("DEBUG: No final results after content extraction/filtering.")
+            logger.debug("No final results after content extraction/filtering.")
             return {"response": "No relevant internal Confluence documents found after content extraction."}
 
 
-        return {"results": final_results}
+        return {"results": _select_content(query, final_results)}
 
 
-    except requests.exceptions.Timeout:
-        print("DEBUG: Confluence request timed out.")
+    except httpx.TimeoutException:
+        logger.warning("Confluence request timed out.")
         return {"error": f"Request to Confluence timed out."}
-    except requests.exceptions.RequestException as e:
-        print(f"DEBUG: Confluence API request failed: {e}")
+    except httpx.HTTPError as e:
+        logger.warning("Confluence API request failed: %s", e)
         return {"error": f"Confluence API request failed: {e}"}
     except Exception as e:
-        print(f"DEBUG: An unexpected error occurred: {e}")
-        return {"error": f"An unexpected error occurred during Confluence search: {e}"}
\ No newline at end of file
+        logger.exception("Unexpected error during Confluence search")
+        return {"error": f"An unexpected error occurred during Confluence search: {e}"}
+
+
+def internal_confluence_search(query: str, limit: int = 3):
+    """
+    Searches internal Confluence content based on a keyword or phrase,
+    then fetches the top results and returns the passages of each page that best match the query.
+    """
+    return run_sync(internal_confluence_search_async(query, limit))
@@ -0,0 +1,172 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+
+# Default byte budgets for the two tiers.
+DEFAULT_MEMORY_BYTES = 64 * 1024 * 1024
+DEFAULT_DISK_BYTES = 512 * 1024 * 1024
+# Disk eviction trims to this share of the budget, so the directory is not rescanned on every put.
+DISK_EVICT_TARGET = 0.9
+
+_UNSAFE_FILENAME_RE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class PageTextCache:
+    """
+    Two-tier cache of extracted Confluence page text keyed by (content_id, version).
+
+    Tier 1 is an in-memory LRU bounded by `memory_bytes`. Tier 2 is an optional directory of
+    text files bounded by `disk_bytes`, evicted least-recently-used by file mtime. The disk total is
+    tracked as files are written and the directory is only scanned once it exceeds the budget.
+    Because the key includes the version, an entry never goes stale; old versions simply age out.
+    """
+
+    def __init__(self, memory_bytes=DEFAULT_MEMORY_BYTES, disk_dir=None, disk_bytes=DEFAULT_DISK_BYTES):
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._memory_used = 0
+        self._disk_used = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "memory_evictions": 0, "disk_evictions": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_used = sum(entry.stat().st_size for entry in os.scandir(disk_dir) if entry.name.endswith(".txt"))
+
+    def _disk_path(self, content_id, version):
+        return os.path.join(self.disk_dir, _UNSAFE_FILENAME_RE.sub("_", f"{content_id}-{version}") + ".txt")
+
+    def get(self, content_id, version):
+        """
+        Returns the cached text for this exact page version, or None.
+        """
+        if version is None:
+            return None
+        key = (str(content_id), version)
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return text
+
+        if self.disk_dir:
+            path = self._disk_path(*key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    text = f.read()
+                os.utime(path)
+            except FileNotFoundError:
+                text = None
+            if text is not None:
+                with self._lock:
+                    self.stats["disk_hits"] += 1
+                    self._put_memory(key, text)
+                return text
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, content_id, version, text):
+        if version is None:
+            return
+        key = (str(content_id), version)
+        with self._lock:
+            self._put_memory(key, text)
+        if self.disk_dir:
+            path = self._disk_path(*key)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            try:
+                replaced = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._disk_used += os.path.getsize(path) - replaced
+                over_budget = self._disk_used > self.disk_bytes
+            if over_budget:
+                self._evict_disk()
+
+    def _put_memory(self, key, text):
+        size = len(text.encode("utf-8"))
+        if size > self.memory_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._memory_used -= len(old.encode("utf-8"))
+        self._entries[key] = text
+        self._memory_used += size
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._memory_used -= len(evicted.encode("utf-8"))
+            self.stats["memory_evictions"] += 1
+
+    def _evict_disk(self):
+        """
+        Removes the least recently used files until the directory is back under DISK_EVICT_TARGET
+        of the budget. The scan also corrects the tracked total for files written by other processes.
+        """
+        files = []
+        total = 0
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".txt"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        files.sort()
+        target = self.disk_bytes * DISK_EVICT_TARGET if total > self.disk_bytes else total
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            with self._lock:
+                self.stats["disk_evictions"] += 1
+        with self._lock:
+            self._disk_used = total
+
+    def snapshot(self):
+        """
+        Returns counters plus current memory usage and hit rate.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._entries)
+            stats["memory_bytes"] = self._memory_used
+            stats["disk_bytes"] = self._disk_used
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    """
+    Returns the process-wide page text cache configured from CONFLUENCE_PAGE_CACHE_MB,
+    CONFLUENCE_PAGE_CACHE_DIR and CONFLUENCE_PAGE_CACHE_DISK_MB. Set CONFLUENCE_PAGE_CACHE_MB=0 to disable.
+    """
+    global _page_cache
+    with _page_cache_lock:
+        if _page_cache is None:
+            memory_mb = float(os.getenv("CONFLUENCE_PAGE_CACHE_MB", DEFAULT_MEMORY_BYTES / (1024 * 1024)))
+            if memory_mb <= 0:
+                return None
+            disk_mb = float(os.getenv("CONFLUENCE_PAGE_CACHE_DISK_MB", DEFAULT_DISK_BYTES / (1024 * 1024)))
+            _page_cache = PageTextCache(
+                memory_bytes=int(memory_mb * 1024 * 1024),
+                disk_dir=os.getenv("CONFLUENCE_PAGE_CACHE_DIR") or None,
+                disk_bytes=int(disk_mb * 1024 * 1024),
+            )
+        return _page_cache
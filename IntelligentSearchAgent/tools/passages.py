@@ -0,0 +1,168 @@
+import re
+import math
+from collections import Counter
+from .telemetry import span
+
+
+# Target passage size in characters; lines are grouped until a passage reaches it.
+DEFAULT_PASSAGE_CHARS = 600
+# Rough characters-per-token ratio used to turn a token budget into text length.
+CHARS_PER_TOKEN = 4
+# Passages whose word 3-gram shingles overlap at least this much (Jaccard) count as duplicates.
+NEAR_DUPLICATE_THRESHOLD = 0.7
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+GAP_MARKER = "[...]"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it my of on or the this to was we what when "
+    "where which who why will with you your about into our me".split()
+)
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def estimate_tokens(text):
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def _split_long_line(line, target_chars):
+    pieces, current = [], ""
+    for sentence in _SENTENCE_RE.split(line):
+        while len(sentence) > 2 * target_chars:
+            cut = sentence.rfind(" ", 0, target_chars)
+            cut = cut if cut > 0 else target_chars
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if current and len(current) + len(sentence) > target_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_passages(text, target_chars=DEFAULT_PASSAGE_CHARS):
+    """
+    Splits extracted text into passages of roughly `target_chars`, keeping line boundaries where
+    possible. Very long lines are split on sentence boundaries.
+    """
+    passages, current, current_len = [], [], 0
+    for line in text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        for piece in (_split_long_line(line, target_chars) if len(line) > 2 * target_chars else [line]):
+            current.append(piece)
+            current_len += len(piece) + 1
+            if current_len >= target_chars:
+                passages.append("\n".join(current))
+                current, current_len = [], 0
+    if current:
+        passages.append("\n".join(current))
+    return passages
+
+
+def _shingles(tokens):
+    if len(tokens) < 3:
+        return frozenset(tokens)
+    return frozenset(hash(tuple(tokens[i:i + 3])) for i in range(len(tokens) - 2))
+
+
+def _is_near_duplicate(shingles, selected):
+    if not shingles:
+        return False
+    for other in selected:
+        union = len(shingles | other)
+        if union and len(shingles & other) / union >= NEAR_DUPLICATE_THRESHOLD:
+            return True
+    return False
+
+
+def _bm25_scores(query_terms, passage_tokens):
+    """
+    Scores every passage against `query_terms` with BM25, treating the passages themselves as the corpus.
+    """
+    n = len(passage_tokens)
+    if not query_terms or not n:
+        return [0.0] * n
+    term_counts = [Counter(tokens) for tokens in passage_tokens]
+    lengths = [len(tokens) for tokens in passage_tokens]
+    avg_len = sum(lengths) / n or 1.0
+    scores = [0.0] * n
+    for term in set(query_terms):
+        df = sum(1 for counts in term_counts if term in counts)
+        if not df:
+            continue
+        idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        for i, counts in enumerate(term_counts):
+            tf = counts.get(term)
+            if tf:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[i] / avg_len)
+                scores[i] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+    return scores
+
+
+def select_passages(query, texts, token_budget, target_chars=DEFAULT_PASSAGE_CHARS):
+    """
+    Picks the passages of each text in `texts` that best match `query`, within `token_budget`
+    tokens per text, and returns one string per text with the passages in document order and
+    `[...]` where text was skipped.
+
+    All passages are scored together with BM25, so rare query terms weigh more. Texts are handled in
+    order and a passage that nearly duplicates one already kept (in this or an earlier text) is
+    dropped. When the query matches some passage of a text, only matching passages of that text are
+    kept; without a query, or when nothing in it matches, passages are kept from the top of the text.
+    """
+    with span("select_passages", kind="extract", texts=len(texts), token_budget=token_budget):
+        query_terms = tokenize(query or "")
+        split = [split_passages(text, target_chars) for text in texts]
+        flat_tokens = [tokenize(passage) for passages in split for passage in passages]
+        flat_scores = _bm25_scores(query_terms, flat_tokens)
+
+        selected_shingles = []
+        results = []
+        offset = 0
+        for passages in split:
+            tokens = flat_tokens[offset:offset + len(passages)]
+            scores = flat_scores[offset:offset + len(passages)]
+            offset += len(passages)
+            # Best score first; ties (including "no query") fall back to document order.
+            order = sorted(range(len(passages)), key=lambda i: (-scores[i], i))
+            if any(score > 0 for score in scores):
+                # Unmatched passages would only pad the budget with text the query did not ask for.
+                order = [i for i in order if scores[i] > 0]
+
+            kept, used = [], 0
+            for i in order:
+                shingles = _shingles(tokens[i])
+                if _is_near_duplicate(shingles, selected_shingles):
+                    continue
+                cost = estimate_tokens(passages[i])
+                if used + cost > token_budget:
+                    if kept:
+                        continue
+                    # Always return something: the best passage, cut to the budget.
+                    passages[i] = passages[i][:token_budget * CHARS_PER_TOKEN]
+                    cost = token_budget
+                kept.append(i)
+                used += cost
+                selected_shingles.append(shingles)
+
+            pieces = []
+            previous = -1
+            for i in sorted(kept):
+                if i != previous + 1:
+                    pieces.append(GAP_MARKER)
+                pieces.append(passages[i])
+                previous = i
+            if kept and previous != len(passages) - 1:
+                pieces.append(GAP_MARKER)
+            results.append("\n".join(pieces))
+        return results
@@ -0,0 +1,312 @@
+import os
+import time
+import random
+import asyncio
+import functools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+import httpx
+from .telemetry import get_logger, Counter, METRICS
+
+
+logger = get_logger(__name__)
+
+DEFAULT_TOOL_DEADLINE = 30.0
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_RETRY_BACKOFF = 0.25
+MAX_RETRY_BACKOFF = 4.0
+DEFAULT_RETRY_AFTER_MAX = 30.0
+DEFAULT_FAILURE_RATIO = 0.5
+DEFAULT_MIN_REQUESTS = 10
+CIRCUIT_WINDOW = 20
+DEFAULT_RESET_SECONDS = 30.0
+
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+# Statuses where the server refused the request before acting on it, so even a POST can be retried.
+REJECTED_STATUSES = frozenset({429, 503})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# Transport errors raised before the request reached the server; safe to retry for any method.
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+RETRIES = Counter("tools_http_retries_total", "HTTP attempts retried by the resilience layer, by reason.")
+CIRCUIT_REJECTIONS = Counter("tools_circuit_rejections_total", "Requests failed fast because a backend's circuit was open.")
+CIRCUIT_OPENED = Counter("tools_circuit_opened_total", "Times a backend's circuit breaker opened.")
+HEDGES = Counter("tools_http_hedges_total", "Hedged GET requests, by which attempt answered first.")
+TOOL_DEADLINES = Counter("tools_deadline_exceeded_total", "Tool calls cut off by their end-to-end deadline.")
+METRICS.extend([RETRIES, CIRCUIT_REJECTIONS, CIRCUIT_OPENED, HEDGES, TOOL_DEADLINES])
+
+
+# --- End-to-end deadlines ---
+
+_deadline = contextvars.ContextVar("tools_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds):
+    """
+    Sets an absolute deadline `seconds` from now for the enclosed calls. A tighter enclosing deadline wins.
+    """
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time():
+    """
+    Seconds left before the current deadline, or None when no deadline is set.
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def with_deadline(func):
+    """
+    Decorator for async tools: bounds the whole call by TOOL_DEADLINE seconds and turns an overrun
+    into an {"error": ...} result. HTTP requests made inside shrink their timeouts and retries to fit.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        seconds = float(os.getenv("TOOL_DEADLINE", DEFAULT_TOOL_DEADLINE))
+        with deadline_scope(seconds):
+            try:
+                return await asyncio.wait_for(func(*args, **kwargs), timeout=remaining_time())
+            except asyncio.TimeoutError:
+                TOOL_DEADLINES.inc(tool=func.__name__.removesuffix("_async"))
+                logger.warning("%s exceeded its %gs deadline.", func.__name__, seconds)
+                return {"error": f"The request did not finish within the {seconds:g} second deadline."}
+    return wrapper
+
+
+# --- Circuit breakers ---
+
+class CircuitOpenError(httpx.TransportError):
+    """
+    Raised instead of sending a request while the backend's circuit is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Failure-rate breaker for one backend. Once at least `min_requests` of the last CIRCUIT_WINDOW
+    attempts were recorded and `failure_ratio` of them failed (transport errors, 5xx or 429), it
+    opens and rejects requests for `reset_seconds`, then lets a single probe through; the probe's
+    outcome closes or re-opens it. A rate rather than a consecutive count keeps concurrent traffic
+    with occasional errors from tripping it.
+    """
+
+    def __init__(self, name, failure_ratio=DEFAULT_FAILURE_RATIO, min_requests=DEFAULT_MIN_REQUESTS, reset_seconds=DEFAULT_RESET_SECONDS):
+        self.name = name
+        self.failure_ratio = failure_ratio
+        self.min_requests = min_requests
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.outcomes = deque(maxlen=CIRCUIT_WINDOW)
+        self.opened_at = 0.0
+        self.probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def before_request(self, request=None):
+        with self._lock:
+            if self.state == "closed":
+                return
+            now = time.monotonic()
+            if self.state == "open" and now - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self.probe_started = now
+                return
+            # A probe that never reported back (e.g. it was cancelled) is replaced after reset_seconds.
+            if self.state == "half_open" and now - self.probe_started >= self.reset_seconds:
+                self.probe_started = now
+                return
+        CIRCUIT_REJECTIONS.inc(backend=self.name)
+        raise CircuitOpenError(f"Circuit for {self.name} is open after repeated failures; failing fast.", request=request)
+
+    def record_success(self):
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "closed"
+                self.outcomes.clear()
+            self.outcomes.append(False)
+
+    def record_failure(self):
+        with self._lock:
+            self.outcomes.append(True)
+            failures = sum(self.outcomes)
+            tripped = len(self.outcomes) >= self.min_requests and failures >= self.failure_ratio * len(self.outcomes)
+            if self.state == "half_open" or (self.state == "closed" and tripped):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                CIRCUIT_OPENED.inc(backend=self.name)
+                logger.warning("Circuit for %s opened: %d of the last %d attempts failed.", self.name, failures, len(self.outcomes))
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self.state, "failures": sum(self.outcomes), "window": len(self.outcomes)}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(backend):
+    """
+    Returns the process-wide breaker for `backend` (host[:port]), configured from
+    CIRCUIT_FAILURE_RATIO, CIRCUIT_MIN_REQUESTS and CIRCUIT_RESET_SECONDS.
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(backend)
+        if breaker is None:
+            breaker = _breakers[backend] = CircuitBreaker(
+                backend,
+                failure_ratio=float(os.getenv("CIRCUIT_FAILURE_RATIO", DEFAULT_FAILURE_RATIO)),
+                min_requests=int(os.getenv("CIRCUIT_MIN_REQUESTS", DEFAULT_MIN_REQUESTS)),
+                reset_seconds=float(os.getenv("CIRCUIT_RESET_SECONDS", DEFAULT_RESET_SECONDS)),
+            )
+        return breaker
+
+
+def circuit_snapshot():
+    with _breakers_lock:
+        return {name: breaker.snapshot() for name, breaker in _breakers.items()}
+
+
+# --- Retries and hedging ---
+
+def parse_retry_after(value):
+    """
+    Parses a Retry-After header (delta-seconds or HTTP-date) into seconds, or None.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps an httpx transport with deadline-aware timeouts, jittered exponential-backoff retries that
+    honour Retry-After, a circuit breaker per host and, when HTTP_HEDGE_AFTER_MS is set, a hedged
+    second attempt for GETs that have not answered by then.
+
+    Idempotent methods are retried on transport errors and 429/502/503/504; other methods only when
+    the request never left (connect errors) or the server rejected it with 429/503.
+    """
+
+    def __init__(self, transport, idempotent_methods=IDEMPOTENT_METHODS, max_retries=None, backoff=None, hedge_after=None):
+        self.transport = transport
+        self.idempotent_methods = frozenset(idempotent_methods)
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("HTTP_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+        self.backoff = backoff if backoff is not None else float(os.getenv("HTTP_RETRY_BACKOFF", DEFAULT_RETRY_BACKOFF))
+        self.retry_after_max = float(os.getenv("HTTP_RETRY_AFTER_MAX", DEFAULT_RETRY_AFTER_MAX))
+        self.hedge_after = hedge_after if hedge_after is not None else float(os.getenv("HTTP_HEDGE_AFTER_MS", 0)) / 1000
+
+    def _retry_delay(self, attempt, retry_after=None):
+        """
+        Full-jitter backoff, raised to Retry-After when the server sent one. Returns None when the
+        wait would exceed HTTP_RETRY_AFTER_MAX or the current deadline.
+        """
+        delay = random.uniform(0, min(MAX_RETRY_BACKOFF, self.backoff * 2 ** attempt))
+        if retry_after is not None:
+            if retry_after > self.retry_after_max:
+                return None
+            delay = max(delay, retry_after)
+        remaining = remaining_time()
+        if remaining is not None and delay >= remaining:
+            return None
+        return delay
+
+    def _apply_deadline(self, request):
+        remaining = remaining_time()
+        if remaining is None:
+            return
+        if remaining <= 0:
+            raise httpx.TimeoutException("Tool deadline exceeded before the request was sent.", request=request)
+        timeouts = dict(request.extensions.get("timeout") or {})
+        request.extensions["timeout"] = {
+            key: remaining if timeouts.get(key) is None else min(timeouts[key], remaining)
+            for key in ("connect", "read", "write", "pool")
+        }
+
+    async def _send(self, request):
+        if not self.hedge_after or request.method not in ("GET", "HEAD"):
+            return await self.transport.handle_async_request(request)
+
+        primary = asyncio.ensure_future(self.transport.handle_async_request(request))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        except BaseException:
+            # asyncio.wait does not cancel what it waits on; a cancelled caller must not orphan the attempt.
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+
+        hedge = asyncio.ensure_future(self.transport.handle_async_request(request))
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if task.exception() is None]
+                if winners:
+                    for extra in winners[1:]:
+                        await extra.result().aclose()
+                    HEDGES.inc(answered_by="primary" if winners[0] is primary else "hedge")
+                    return winners[0].result()
+                error = next(iter(done)).exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def handle_async_request(self, request):
+        breaker = get_circuit_breaker(request.url.netloc.decode("ascii"))
+        idempotent = request.method in self.idempotent_methods
+        attempt = 0
+        while True:
+            breaker.before_request(request)
+            self._apply_deadline(request)
+            try:
+                response = await self._send(request)
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                retryable = idempotent or isinstance(e, NOT_SENT_ERRORS)
+                delay = self._retry_delay(attempt) if retryable and attempt < self.max_retries else None
+                if delay is None:
+                    raise
+                reason = type(e).__name__
+            else:
+                status = response.status_code
+                if status >= 500 or status == 429:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                retryable = status in RETRY_STATUSES and (idempotent or status in REJECTED_STATUSES)
+                if not retryable or attempt >= self.max_retries:
+                    return response
+                delay = self._retry_delay(attempt, parse_retry_after(response.headers.get("Retry-After")))
+                if delay is None:
+                    return response
+                await response.aclose()
+                reason = str(status)
+
+            RETRIES.inc(reason=reason)
+            logger.debug("Retrying %s %s in %.2fs after %s (attempt %d).", request.method, request.url, delay, reason, attempt + 1)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self):
+        await self.transport.aclose()
@@ -0,0 +1,247 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+
+
+# Default byte budget for cached extracted text, shared by the memory and disk tiers.
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+# Disk eviction trims to this share of the budget, so the directory is not rescanned on every store.
+DISK_EVICT_TARGET = 0.9
+
+_MAX_AGE_RE = re.compile(r"max-age\s*=\s*(\d+)")
+
+
+def _current_age(response_headers):
+    try:
+        return max(0, int(response_headers.get("age", 0)))
+    except ValueError:
+        return 0
+
+
+def freshness_lifetime(response_headers):
+    """
+    Seconds a response may be served without revalidation according to Cache-Control/Expires.
+    For max-age, the time the response already spent in upstream caches (Age) is subtracted.
+    Returns None when the response must not be stored at all (no-store).
+    """
+    cache_control = response_headers.get("cache-control", "").lower()
+    if "no-store" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return 0
+    match = _MAX_AGE_RE.search(cache_control)
+    if match:
+        return max(0, int(match.group(1)) - _current_age(response_headers))
+    expires = response_headers.get("expires")
+    if expires:
+        # Expires is an absolute time, so Age does not shorten it further.
+        try:
+            return max(0, int(parsedate_to_datetime(expires).timestamp() - time.time()))
+        except (TypeError, ValueError):
+            return 0
+    return 0
+
+
+class ScrapeCache:
+    """
+    Cache of extracted page text keyed by URL, with the validators needed for conditional GETs.
+
+    Entries are fresh for their Cache-Control max-age; after that the caller revalidates with
+    If-None-Match / If-Modified-Since and a 304 reuses the stored text without re-parsing.
+    Entries live in a byte-bounded LRU and, when `disk_dir` is set, persist as JSON files so they
+    survive restarts. The same `max_bytes` cap is applied to the disk tier, whose total is tracked
+    as entries are written and only rescanned once it exceeds the cap.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._used = 0
+        self._disk_used = 0
+        self.stats = {"fresh_hits": 0, "revalidated": 0, "misses": 0, "stores": 0, "evictions": 0, "bytes_saved": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_used = sum(entry.stat().st_size for entry in os.scandir(disk_dir) if entry.name.endswith(".json"))
+
+    @staticmethod
+    def _entry_size(entry):
+        return len(entry["text"].encode("utf-8"))
+
+    def _disk_path(self, url):
+        return os.path.join(self.disk_dir, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, url):
+        """
+        Returns the stored entry for `url` (fresh or stale), or None.
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+                return entry
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(url)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        with self._lock:
+            self._put_memory(url, entry)
+        return entry
+
+    @staticmethod
+    def is_fresh(entry):
+        return time.time() - entry["stored_at"] < entry["max_age"]
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def record_fresh_hit(self, entry):
+        with self._lock:
+            self.stats["fresh_hits"] += 1
+            self.stats["bytes_saved"] += entry.get("body_bytes", 0)
+
+    def record_miss(self):
+        with self._lock:
+            self.stats["misses"] += 1
+
+    def revalidated(self, url, entry, response_headers):
+        """
+        Handles a 304: refreshes the freshness lifetime (and any new validators) of the stored entry.
+        """
+        max_age = freshness_lifetime(response_headers)
+        with self._lock:
+            self.stats["revalidated"] += 1
+            self.stats["bytes_saved"] += entry.get("body_bytes", 0)
+        if max_age is None:
+            return
+        entry = dict(entry, stored_at=time.time(), max_age=max_age)
+        entry["etag"] = response_headers.get("etag", entry.get("etag"))
+        entry["last_modified"] = response_headers.get("last-modified", entry.get("last_modified"))
+        self._store(url, entry)
+
+    def put(self, url, text, response_headers, body_bytes):
+        """
+        Stores freshly extracted text with the response's validators. No-op for no-store responses
+        and for responses that carry neither validators nor a positive max-age.
+        """
+        max_age = freshness_lifetime(response_headers)
+        etag = response_headers.get("etag")
+        last_modified = response_headers.get("last-modified")
+        if max_age is None or not (max_age > 0 or etag or last_modified):
+            return
+        entry = {
+            "url": url,
+            "text": text,
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": time.time(),
+            "max_age": max_age,
+            "body_bytes": body_bytes,
+        }
+        with self._lock:
+            self.stats["stores"] += 1
+        self._store(url, entry)
+
+    def _store(self, url, entry):
+        with self._lock:
+            self._put_memory(url, entry)
+        if self.disk_dir:
+            path = self._disk_path(url)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            try:
+                replaced = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._disk_used += os.path.getsize(path) - replaced
+                over_budget = self._disk_used > self.max_bytes
+            if over_budget:
+                self._evict_disk()
+
+    def _put_memory(self, url, entry):
+        size = self._entry_size(entry)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(url, None)
+        if old is not None:
+            self._used -= self._entry_size(old)
+        self._entries[url] = entry
+        self._used += size
+        while self._used > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._used -= self._entry_size(evicted)
+            self.stats["evictions"] += 1
+
+    def _evict_disk(self):
+        files = []
+        total = 0
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        files.sort()
+        target = self.max_bytes * DISK_EVICT_TARGET if total > self.max_bytes else total
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            with self._lock:
+                self.stats["evictions"] += 1
+        with self._lock:
+            self._disk_used = total
+
+    def snapshot(self):
+        """
+        Returns counters plus current size and hit rate. Revalidated (304) responses count as hits.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._used
+        lookups = stats["fresh_hits"] + stats["revalidated"] + stats["misses"]
+        stats["hit_rate"] = (stats["fresh_hits"] + stats["revalidated"]) / lookups if lookups else 0.0
+        return stats
+
+
+_scrape_cache = None
+_scrape_cache_lock = threading.Lock()
+
+
+def get_scrape_cache():
+    """
+    Returns the process-wide scrape cache configured from SCRAPE_CACHE_MB and SCRAPE_CACHE_DIR.
+    Set SCRAPE_CACHE_MB=0 to disable.
+    """
+    global _scrape_cache
+    with _scrape_cache_lock:
+        if _scrape_cache is None:
+            max_mb = float(os.getenv("SCRAPE_CACHE_MB", DEFAULT_MAX_BYTES / (1024 * 1024)))
+            if max_mb <= 0:
+                return None
+            _scrape_cache = ScrapeCache(max_bytes=int(max_mb * 1024 * 1024), disk_dir=os.getenv("SCRAPE_CACHE_DIR") or None)
+        return _scrape_cache
@@ -1,46 +1,135 @@
-import requests
+import os
+import asyncio
+import httpx
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
+from .http_client import get_http_client, run_sync
+from .scrape_cache import get_scrape_cache
+from .html_extract import extract_from_stream, DEFAULT_MAX_BYTES
+from .telemetry import get_logger, span, traced_tool, EXTRACTED_CHARS
+from .resilience import with_deadline
+from .passages import select_passages
 load_dotenv()
 
 
-def scrape_webpage_content(url: str):
+logger = get_logger(__name__)
+
+
+SCRAPE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+}
+SCRAPE_TIMEOUT = 15
+# Main-region text extracted (and cached) per page; passages for the model are chosen from it.
+MAX_EXTRACT_CHARS = 40000
+# Token budget for the passages returned per page.
+DEFAULT_PASSAGE_TOKENS = 1500
+
+
+def extract_main_text(html):
     """
-    Use this tool to extract clean, readable text from a specific web page URL.
-    Provide the full URL as an argument.
+    Strips page chrome from `html` and returns the text of the main content region.
     """
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status()
+    soup = BeautifulSoup(html, 'html.parser')
+
+
+    for tag in soup(['script', 'style', 'header', 'footer', 'nav', 'aside', 'form', 'noscript', 'img', 'link', 'meta']):
+        tag.decompose()
+
+
+    main_content = soup.find('main') or soup.find('article') or soup.find('div', class_='content') or soup.find('div', {'role': 'main'})
+    if main_content:
+        return main_content.get_text(separator="\n", strip=True)
+    return soup.get_text(separator="\n", strip=True)
+
+
+def select_content(url, text, query=""):
+    """
+    Returns the passages of `text` that best match `query` within SCRAPE_PASSAGE_TOKENS tokens.
+    Without a query the passages are taken from the top of the page.
+    """
+    token_budget = int(os.getenv("SCRAPE_PASSAGE_TOKENS", DEFAULT_PASSAGE_TOKENS))
+    return {"url": url, "content": select_passages(query, [text], token_budget)[0]}
 
 
-        soup = BeautifulSoup(response.text, 'html.parser')
+async def fetch_main_text(url, request_headers, max_chars=MAX_EXTRACT_CHARS):
+    """
+    GETs `url` and extracts its main text. Returns (response, text, body_bytes); text is None for a 304.
 
+    SCRAPE_EXTRACTION_MODE=streaming (default) reads the body in chunks up to SCRAPE_MAX_BYTES and stops
+    once `max_chars` of main-region text is collected; `full` downloads the whole page and uses BeautifulSoup.
+    """
+    client = get_http_client()
+    if os.getenv("SCRAPE_EXTRACTION_MODE", "streaming") == "full":
+        response = await client.get(url, headers=request_headers, timeout=SCRAPE_TIMEOUT)
+        if response.status_code == 304:
+            return response, None, 0
+        response.raise_for_status()
+        with span("html_full", kind="extract", bytes=len(response.content)):
+            text = await asyncio.to_thread(extract_main_text, response.text)
+        EXTRACTED_CHARS.inc(len(text), source="web")
+        return response, text, len(response.content)
 
-        for tag in soup(['script', 'style', 'header', 'footer', 'nav', 'aside', 'form', 'noscript', 'img', 'link', 'meta']):
-            tag.decompose()
+    max_bytes = int(os.getenv("SCRAPE_MAX_BYTES", DEFAULT_MAX_BYTES))
+    async with client.stream("GET", url, headers=request_headers, timeout=SCRAPE_TIMEOUT) as response:
+        if response.status_code == 304:
+            return response, None, 0
+        response.raise_for_status()
+        # The streaming span includes the time spent waiting on body chunks.
+        with span("html_streaming", kind="extract") as extract_span:
+            text, body_bytes = await extract_from_stream(response, max_chars, max_bytes)
+            extract_span.set(bytes=body_bytes)
+    EXTRACTED_CHARS.inc(len(text), source="web")
+    return response, text, body_bytes
 
 
-        main_content = soup.find('main') or soup.find('article') or soup.find('div', class_='content') or soup.find('div', {'role': 'main'})
-        if main_content:
-            text = main_content.get_text(separator="\n", strip=True)
-        else:
-            text = soup.get_text(separator="\n", strip=True)
+@traced_tool
+@with_deadline
+async def scrape_webpage_content_async(url: str, query: str = ""):
+    """
+    Use this tool to extract clean, readable text from a specific web page URL.
+    Provide the full URL as an argument, and the user's question as `query` so the
+    passages of the page most relevant to it are returned.
+    """
+    try:
+        scrape_cache = get_scrape_cache()
+        cached = scrape_cache.get(url) if scrape_cache is not None else None
+        request_headers = SCRAPE_HEADERS
+        if cached is not None:
+            if scrape_cache.is_fresh(cached):
+                scrape_cache.record_fresh_hit(cached)
+                return select_content(url, cached["text"], query)
+            request_headers = {**SCRAPE_HEADERS, **scrape_cache.conditional_headers(cached)}
 
 
-        max_length = 8000
-        if len(text) > max_length:
-            return {"url": url, "content": text[:max_length] + "\n\n... (content truncated for brevity)"}
-        else:
-            return {"url": url, "content": text}
+        response, text, body_bytes = await fetch_main_text(url, request_headers)
+        if text is None:
+            if cached is None:
+                return {"error": f"Failed to retrieve content from {url}: unexpected 304 Not Modified"}
+            scrape_cache.revalidated(url, cached, response.headers)
+            return select_content(url, cached["text"], query)
 
 
-    except requests.exceptions.Timeout:
-        return {"error": f"Request to {url} timed out after 15 seconds."}
-    except requests.exceptions.RequestException as e:
+        if scrape_cache is not None:
+            scrape_cache.record_miss()
+            scrape_cache.put(url, text, response.headers, body_bytes)
+        return select_content(url, text, query)
+
+
+    except httpx.TimeoutException:
+        logger.warning("Request to %s timed out.", url)
+        return {"error": f"Request to {url} timed out after {SCRAPE_TIMEOUT} seconds."}
+    except httpx.HTTPError as e:
+        logger.warning("Failed to retrieve %s: %s", url, e)
         return {"error": f"Failed to retrieve content from {url}: {e}"}
     except Exception as e:
-        return {"error": f"An unexpected error occurred while scraping {url}: {e}"}
\ No newline at end of file
+        logger.exception("Unexpected error while scraping %s", url)
+        return {"error": f"An unexpected error occurred while scraping {url}: {e}"}
+
+
+def scrape_webpage_content(url: str, query: str = ""):
+    """
+    Use this tool to extract clean, readable text from a specific web page URL.
+    Provide the full URL as an argument, and the user's question as `query` so the
+    passages of the page most relevant to it are returned.
+    """
+    return run_sync(scrape_webpage_content_async(url, query))
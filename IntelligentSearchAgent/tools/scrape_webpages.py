@@ -0,0 +1,94 @@
+import os
+import time
+import asyncio
+from urllib.parse import urlsplit
+from dotenv import load_dotenv
+from .http_client import run_sync
+from .scrape_webpage_content import scrape_webpage_content_async
+from .telemetry import get_logger, traced_tool
+from .resilience import with_deadline
+load_dotenv()
+
+
+logger = get_logger(__name__)
+
+
+# Politeness and latency limits for one batch; overridable through the environment.
+DEFAULT_BATCH_CONCURRENCY = 8
+DEFAULT_BATCH_PER_HOST = 2
+DEFAULT_BATCH_DEADLINE = 20.0
+
+
+@traced_tool
+@with_deadline
+async def scrape_webpages_async(urls: list[str], query: str = ""):
+    """
+    Use this tool to extract clean, readable text from several web page URLs in one step.
+    Provide the full URLs as a list and the user's question as `query` so each page returns
+    the passages most relevant to it. Pages are fetched concurrently; any page that has not
+    finished when the batch deadline expires is reported with an error instead of content.
+    Each result carries the page 'url', its 'content' or 'error', and 'elapsed_ms' (including time queued for a slot).
+    """
+    concurrency = int(os.getenv("SCRAPE_BATCH_CONCURRENCY", DEFAULT_BATCH_CONCURRENCY))
+    per_host = int(os.getenv("SCRAPE_BATCH_PER_HOST", DEFAULT_BATCH_PER_HOST))
+    deadline = float(os.getenv("SCRAPE_BATCH_DEADLINE", DEFAULT_BATCH_DEADLINE))
+
+    unique_urls = list(dict.fromkeys(url.strip() for url in urls if url and url.strip()))
+    if not unique_urls:
+        return {"error": "No URLs were provided to scrape."}
+
+    global_slots = asyncio.Semaphore(max(1, concurrency))
+    host_slots = {}
+    started = time.perf_counter()
+
+    async def _scrape(url):
+        # Timed from the start of the batch, including the wait for a slot, like the deadline.
+        url_started = time.perf_counter()
+        host = urlsplit(url).netloc
+        host_slot = host_slots.setdefault(host, asyncio.Semaphore(max(1, per_host)))
+        try:
+            async with host_slot, global_slots:
+                result = await scrape_webpage_content_async(url, query)
+        except Exception as e:
+            # One failing page must not drop the results of the rest of the batch.
+            logger.exception("Unexpected error scraping %s", url)
+            result = {"error": f"An unexpected error occurred while scraping {url}: {e}"}
+        result = dict(result, url=url)
+        result["elapsed_ms"] = round((time.perf_counter() - url_started) * 1000)
+        return result
+
+    tasks = {url: asyncio.create_task(_scrape(url)) for url in unique_urls}
+    _, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+    for task in pending:
+        task.cancel()
+
+    results = []
+    for url, task in tasks.items():
+        if task in pending:
+            results.append({
+                "url": url,
+                "error": f"Scraping {url} did not finish within the {deadline:g} second batch deadline.",
+                "elapsed_ms": round(deadline * 1000),
+            })
+        else:
+            results.append(task.result())
+
+    completed = sum(1 for r in results if "content" in r)
+    logger.debug("Batch scrape of %d URLs: %d completed, %d timed out.", len(unique_urls), completed, len(pending))
+    return {
+        "results": results,
+        "completed": completed,
+        "timed_out": len(pending),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000),
+    }
+
+
+def scrape_webpages(urls: list[str], query: str = ""):
+    """
+    Use this tool to extract clean, readable text from several web page URLs in one step.
+    Provide the full URLs as a list and the user's question as `query` so each page returns
+    the passages most relevant to it. Pages are fetched concurrently; any page that has not
+    finished when the batch deadline expires is reported with an error instead of content.
+    Each result carries the page 'url', its 'content' or 'error', and 'elapsed_ms' (including time queued for a slot).
+    """
+    return run_sync(scrape_webpages_async(urls, query))
@@ -0,0 +1,132 @@
+import os
+import re
+import time
+import asyncio
+import threading
+import unicodedata
+import weakref
+from collections import OrderedDict
+
+
+DEFAULT_TTL = 900
+DEFAULT_MAX_ENTRIES = 512
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query):
+    """
+    Canonical form used for cache keys: NFKC, case-folded, whitespace collapsed and
+    trailing sentence punctuation removed. Inner punctuation is kept so 'c++' and 'c#' stay distinct.
+    """
+    query = unicodedata.normalize("NFKC", query).casefold()
+    query = _WHITESPACE_RE.sub(" ", query).strip()
+    return query.rstrip("?!.。 ")
+
+
+class SearchResultCache:
+    """
+    TTL + LRU cache of raw search result lists with single-flight coalescing: while one
+    upstream request for a key is in flight, identical lookups on the same event loop await it
+    instead of issuing their own. Failed fetches are not cached.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._inflight = weakref.WeakKeyDictionary()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expired": 0}
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at >= self.ttl:
+                del self._entries[key]
+                self.stats["expired"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    async def get_or_fetch(self, key, fetch):
+        """
+        Returns the cached value for `key`, or awaits `fetch()` once and shares its result with concurrent callers.
+        If the caller that owns the in-flight request is cancelled, waiting callers start a fresh fetch.
+        """
+        value = self._lookup(key)
+        if value is not None:
+            return value
+
+        inflight = self._inflight.setdefault(asyncio.get_running_loop(), {})
+        pending = inflight.get(key)
+        if pending is not None:
+            with self._lock:
+                self.stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+            return await self.get_or_fetch(key, fetch)
+
+        with self._lock:
+            self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        inflight[key] = future
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it.
+            future.exception()
+            raise
+        else:
+            self._store(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            inflight.pop(key, None)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (stats["hits"] + stats["coalesced"]) / lookups if lookups else 0.0
+        return stats
+
+
+_search_cache = None
+_search_cache_lock = threading.Lock()
+
+
+def get_search_cache():
+    """
+    Returns the process-wide search result cache configured from TAVILY_CACHE_TTL and
+    TAVILY_CACHE_SIZE. Set either to 0 to disable caching.
+    """
+    global _search_cache
+    with _search_cache_lock:
+        if _search_cache is None:
+            ttl = float(os.getenv("TAVILY_CACHE_TTL", DEFAULT_TTL))
+            max_entries = int(os.getenv("TAVILY_CACHE_SIZE", DEFAULT_MAX_ENTRIES))
+            if ttl <= 0 or max_entries <= 0:
+                return None
+            _search_cache = SearchResultCache(max_entries=max_entries, ttl=ttl)
+        return _search_cache
@@ -0,0 +1,236 @@
+import os
+import time
+import uuid
+import bisect
+import logging
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+# Latency buckets in seconds shared by every histogram.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LOGGER_NAME = "IntelligentSearchAgent.tools"
+
+
+def get_logger(name):
+    """
+    Returns a logger under the shared tools namespace. Its level comes from TOOLS_LOG_LEVEL
+    (default WARNING), so per-page and payload debug output is off unless explicitly enabled.
+    """
+    base = logging.getLogger(LOGGER_NAME)
+    if not base.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [trace=%(trace_id)s] %(message)s"))
+        handler.addFilter(_TraceIdFilter())
+        base.addHandler(handler)
+        base.setLevel((os.getenv("TOOLS_LOG_LEVEL") or "WARNING").upper())
+        base.propagate = False
+    return logging.getLogger(f"{LOGGER_NAME}.{name.rsplit('.', 1)[-1]}")
+
+
+class _TraceIdFilter(logging.Filter):
+    def filter(self, record):
+        current = _current_span.get()
+        record.trace_id = current.trace_id if current else "-"
+        return True
+
+
+# --- Metrics ---
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def snapshot(self, **labels):
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            return None if series is None else {"counts": list(series["counts"]), "sum": series["sum"], "count": series["count"]}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, [('le', repr(bound))])} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+
+SPAN_SECONDS = Histogram("tools_span_duration_seconds", "Duration of traced tool phases (tool call, HTTP request, parse/extract).")
+SPAN_ERRORS = Counter("tools_span_errors_total", "Traced phases that raised or returned an error.")
+HTTP_RESPONSE_BYTES = Counter("tools_http_response_bytes_total", "Response body bytes read from upstream services.")
+EXTRACTED_CHARS = Counter("tools_extracted_chars_total", "Characters of text produced by parse/extract phases.")
+METRICS = [SPAN_SECONDS, SPAN_ERRORS, HTTP_RESPONSE_BYTES, EXTRACTED_CHARS]
+
+
+def render_prometheus():
+    """
+    Renders every registered metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Tracing ---
+
+class Span:
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "attributes", "started", "duration", "error")
+
+    def __init__(self, name, kind, parent, attributes):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.started = time.perf_counter()
+        self.duration = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, error):
+        self.error = str(error)
+
+
+_current_span = contextvars.ContextVar("tools_current_span", default=None)
+_span_logger = logging.getLogger(f"{LOGGER_NAME}.trace")
+
+
+@contextmanager
+def span(name, kind="internal", **attributes):
+    """
+    Traces one phase. The duration lands in tools_span_duration_seconds{kind, name}; an exception or
+    a call to `fail()` counts in tools_span_errors_total. Spans nest through a context variable, so
+    HTTP and extract spans inherit the trace id of the tool call that started them.
+    """
+    parent = _current_span.get()
+    current = Span(name, kind, parent, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.fail(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.started
+        SPAN_SECONDS.observe(current.duration, kind=kind, name=name)
+        if current.error is not None:
+            SPAN_ERRORS.inc(kind=kind, name=name)
+        if _span_logger.isEnabledFor(logging.DEBUG):
+            _span_logger.debug("span %s/%s %.1fms parent=%s error=%s attrs=%s", kind, name, current.duration * 1000,
+                               current.parent_id, current.error, current.attributes)
+        _current_span.reset(token)
+
+
+def traced_tool(func):
+    """
+    Decorator for async tools: wraps the whole invocation in a `tool` span and counts
+    returned {"error": ...} dicts as errors.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with span(func.__name__.removesuffix("_async"), kind="tool") as tool_span:
+            result = await func(*args, **kwargs)
+            if isinstance(result, dict) and result.get("error"):
+                tool_span.fail(result["error"])
+            return result
+    return wrapper
+
+
+# --- Exporter ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    """
+    Serves /metrics in Prometheus text format on a daemon thread. Defaults to TOOLS_METRICS_PORT;
+    does nothing when no port is configured or a server is already running.
+    """
+    global _exporter
+    port = port if port is not None else os.getenv("TOOLS_METRICS_PORT")
+    if not port:
+        return None
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            threading.Thread(target=_exporter.serve_forever, name="tools-metrics", daemon=True).start()
+        return _exporter